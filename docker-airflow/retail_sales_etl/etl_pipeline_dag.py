@@ -5,15 +5,14 @@ transforms the data by cleaning and aggregating it, and loads it into a MySQL da
 """
 
 from datetime import datetime, timedelta
-import pandas as pd
 import os
 
 from airflow import DAG
 from airflow.operators.python import PythonOperator
-from airflow.providers.postgres.operators.postgres import PostgresOperator
-from airflow.providers.mysql.operators.mysql import MySqlOperator
-from airflow.providers.postgres.hooks.postgres import PostgresHook
-from airflow.providers.mysql.hooks.mysql import MySqlHook
+
+# Extraction, transformation and loading are done by the shared retail_etl package,
+# imported inside the tasks; connections come from the RETAIL_ETL_* environment
+# instead of Airflow connections, and the warehouse tables from setup_mysql.sql
 
 # Default arguments for the DAG
 default_args = {
@@ -35,34 +34,16 @@ dag = DAG(
     catchup=False,
 )
 
-# Define the path for the CSV file (you might need to adjust this)
-CSV_FILE_PATH = 'in_store_sales.csv'
-
-# Define the SQL for creating MySQL table (if it doesn't exist)
-create_mysql_table_sql = """
-CREATE TABLE IF NOT EXISTS aggregated_sales (
-    product_id INT PRIMARY KEY,
-    total_quantity INT,
-    total_sale_amount DECIMAL(12, 2)
-);
-"""
+# Define the path for the CSV file
+CSV_FILE_PATH = '/opt/airflow/retail_sales_etl/in_store_sales.csv'
 
 # Function to extract data from PostgreSQL
-def extract_postgres_data():
-    postgres_hook = PostgresHook(postgres_conn_id="postgres_conn")
+def extract_postgres_data(**kwargs):
+    from retail_etl import extract_postgres_data
     
-    # SQL query to extract online sales data
-    sql_query = """
-    SELECT product_id, quantity, sale_amount, sale_date
-    FROM online_sales
-    WHERE sale_date = %s
-    """
-    
-    # Get yesterday's date (or adjust based on your requirements)
-    execution_date = "{{ ds }}"
-    
-    # Execute the query and fetch the data
-    df = postgres_hook.get_pandas_df(sql_query, parameters=(execution_date,))
+    # Extract the online sales of the run's date
+    execution_date = kwargs['ds']
+    df = extract_postgres_data(execution_date)
     
     # Save the data to a temporary CSV file for later processing
     temp_file_path = f"/tmp/postgres_data_{execution_date}.csv"
@@ -71,15 +52,12 @@ def extract_postgres_data():
     return temp_file_path
 
 # Function to extract data from CSV
-def extract_csv_data():
-    # Get yesterday's date (or adjust based on your requirements)
-    execution_date = "{{ ds }}"
-    
-    # Read the CSV file
-    df = pd.read_csv(CSV_FILE_PATH)
+def extract_csv_data(**kwargs):
+    from retail_etl import extract_csv_data
     
-    # Filter for the relevant date
-    df = df[df['sale_date'] == execution_date]
+    # Read the in-store sales of the run's date
+    execution_date = kwargs['ds']
+    df = extract_csv_data(CSV_FILE_PATH, execution_date)
     
     # Save the filtered data to a temporary CSV file
     temp_file_path = f"/tmp/csv_data_{execution_date}.csv"
@@ -89,34 +67,16 @@ def extract_csv_data():
 
 # Function to transform the data
 def transform_data(**kwargs):
+    import pandas as pd
+    from retail_etl import transform_data
+    
     # Get the file paths from XCom
     ti = kwargs['ti']
     postgres_file = ti.xcom_pull(task_ids='extract_postgres_data')
     csv_file = ti.xcom_pull(task_ids='extract_csv_data')
     
-    # Read the data from the temporary files
-    df_postgres = pd.read_csv(postgres_file)
-    df_csv = pd.read_csv(csv_file)
-    
-    # Combine the data from both sources
-    df_combined = pd.concat([df_postgres, df_csv], ignore_index=True)
-    
-    # Data cleansing - remove null or invalid entries
-    df_combined = df_combined.dropna()
-    
-    # Ensure numeric types
-    df_combined['quantity'] = pd.to_numeric(df_combined['quantity'], errors='coerce')
-    df_combined['sale_amount'] = pd.to_numeric(df_combined['sale_amount'], errors='coerce')
-    df_combined = df_combined.dropna()
-    
-    # Aggregate the data to calculate totals for each product_id
-    df_aggregated = df_combined.groupby('product_id').agg({
-        'quantity': 'sum',
-        'sale_amount': 'sum'
-    }).reset_index()
-    
-    # Rename columns to match the target schema
-    df_aggregated.columns = ['product_id', 'total_quantity', 'total_sale_amount']
+    # Validate and aggregate to daily per-product totals
+    df_aggregated, _ = transform_data(pd.read_csv(postgres_file), pd.read_csv(csv_file))
     
     # Save the transformed data
     transformed_file_path = f"/tmp/transformed_data_{kwargs['ds']}.csv"
@@ -126,62 +86,36 @@ def transform_data(**kwargs):
 
 # Function to load data to MySQL
 def load_to_mysql(**kwargs):
+    import pandas as pd
+    from retail_etl import load_to_mysql, LOAD_MODE_REPLACE, has_daily_facts, run_etl_pipeline
+    
     # Get the transformed data file path from XCom
     ti = kwargs['ti']
     transformed_file = ti.xcom_pull(task_ids='transform_data')
     
-    # Read the transformed data
-    df = pd.read_csv(transformed_file)
-    
-    # Connect to MySQL using the hook
-    mysql_hook = MySqlHook(mysql_conn_id="mysql_conn")
-    
-    # First, delete existing data for these products to avoid duplicates
-    # We could use REPLACE or ON DUPLICATE KEY UPDATE in a production scenario
-    product_ids = ','.join(str(pid) for pid in df['product_id'].tolist())
-    if product_ids:
-        mysql_hook.run(f"DELETE FROM aggregated_sales WHERE product_id IN ({product_ids})")
-    
-    # Insert the aggregated data
-    # Prepare the data for insertion
-    rows = []
-    for _, row in df.iterrows():
-        rows.append((
-            int(row['product_id']),
-            int(row['total_quantity']),
-            float(row['total_sale_amount'])
-        ))
-    
-    # Insert the data into MySQL
-    mysql_hook.insert_rows(
-        table='aggregated_sales',
-        rows=rows,
-        target_fields=['product_id', 'total_quantity', 'total_sale_amount']
-    )
+    # Replace the run's date in the daily facts, then refresh the rollups and totals; with an
+    # empty daily_sales (an upgraded warehouse) that would leave one day's sales as the totals
+    if has_daily_facts():
+        df = pd.read_csv(transformed_file, parse_dates=['sale_date'])
+        load_to_mysql(df, LOAD_MODE_REPLACE, {kwargs['ds']})
+    else:
+        print("daily_sales is empty, running a full rebuild instead of the per-date load")
+        run_etl_pipeline(CSV_FILE_PATH, force=True)
     
     # Clean up temporary files
-    os.remove(transformed_file)
-    for file_path in ti.xcom_pull(task_ids='extract_postgres_data', include_prior_dates=False):
-        if os.path.exists(file_path):
-            os.remove(file_path)
-    for file_path in ti.xcom_pull(task_ids='extract_csv_data', include_prior_dates=False):
-        if os.path.exists(file_path):
+    for file_path in (transformed_file,
+                      ti.xcom_pull(task_ids='extract_postgres_data'),
+                      ti.xcom_pull(task_ids='extract_csv_data')):
+        if file_path and os.path.exists(file_path):
             os.remove(file_path)
     
     return True
 
-# Task to create the MySQL table if it doesn't exist
-create_mysql_table_task = MySqlOperator(
-    task_id='create_mysql_table',
-    mysql_conn_id='mysql_conn',
-    sql=create_mysql_table_sql,
-    dag=dag,
-)
-
 # Task to extract data from PostgreSQL
 extract_postgres_task = PythonOperator(
     task_id='extract_postgres_data',
     python_callable=extract_postgres_data,
+    provide_context=True,
     dag=dag,
 )
 
@@ -189,6 +123,7 @@ extract_postgres_task = PythonOperator(
 extract_csv_task = PythonOperator(
     task_id='extract_csv_data',
     python_callable=extract_csv_data,
+    provide_context=True,
     dag=dag,
 )
 
@@ -209,4 +144,4 @@ load_task = PythonOperator(
 )
 
 # Define task dependencies
-create_mysql_table_task >> [extract_postgres_task, extract_csv_task] >> transform_task >> load_task 
\ No newline at end of file
+[extract_postgres_task, extract_csv_task] >> transform_task >> load_task 
\ No newline at end of file
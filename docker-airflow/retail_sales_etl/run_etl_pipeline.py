@@ -4,10 +4,7 @@ Run ETL Pipeline and View Results
 This script runs the ETL pipeline and then displays the results from the MySQL database.
 """
 
-import os
-import sys
-import mysql.connector
-from etl_pipeline import run_etl_pipeline
+from retail_etl import run_etl_pipeline, mysql_sink
 
 def run_pipeline():
     """Run the ETL pipeline"""
@@ -28,22 +25,20 @@ def run_pipeline():
 def view_results():
     """Display the results from the MySQL database"""
     try:
-        # Connect to MySQL
-        conn = mysql.connector.connect(
-            host="localhost",
-            database="retail_dw",
-            user="mysql",
-            password="mysql"
-        )
-        
-        # Create a cursor
-        cursor = conn.cursor()
-        
-        # Execute the query
-        cursor.execute("SELECT * FROM aggregated_sales")
-        
-        # Fetch all results
-        results = cursor.fetchall()
+        # Borrow a warehouse connection (settings from the RETAIL_ETL_* environment)
+        with mysql_sink().connection() as conn:
+            cursor = conn.cursor()
+            
+            # Execute the query; products come out by revenue, read in order from the covering index
+            cursor.execute("""
+                SELECT product_id, total_quantity, total_sale_amount
+                FROM aggregated_sales
+                ORDER BY total_sale_amount DESC
+            """)
+            
+            # Fetch all results
+            results = cursor.fetchall()
+            cursor.close()
         
         # Print the results
         print("\n" + "="*50)
@@ -68,11 +63,7 @@ def view_results():
         print(f"Total products: {len(results)}")
         print("="*50)
         
-        # Close the cursor and connection
-        cursor.close()
-        conn.close()
-        
-    except mysql.connector.Error as e:
+    except Exception as e:
         print(f"Error accessing MySQL: {e}")
         
 def main():
@@ -8,7 +8,79 @@ USE retail_dw;
 CREATE TABLE IF NOT EXISTS aggregated_sales (
     product_id INT PRIMARY KEY,
     total_quantity INT,
-    total_sale_amount DECIMAL(12, 2)
+    total_sale_amount DECIMAL(12, 2),
+    -- Covering indexes for ranked queries (top products, products above a threshold);
+    -- existing warehouses get them from migration 2 (python -m retail_etl --migrate)
+    INDEX idx_aggregated_sales_revenue (total_sale_amount DESC, total_quantity),
+    INDEX idx_aggregated_sales_quantity (total_quantity DESC, total_sale_amount)
+);
+
+-- Daily fact table at the (sale_date, product_id) grain
+CREATE TABLE IF NOT EXISTS daily_sales (
+    sale_date DATE NOT NULL,
+    product_id INT NOT NULL,
+    total_quantity INT,
+    total_sale_amount DECIMAL(12, 2),
+    PRIMARY KEY (sale_date, product_id)
+);
+
+-- Weekly rollup of daily_sales (weeks start on Monday)
+CREATE TABLE IF NOT EXISTS weekly_sales (
+    week_start DATE NOT NULL,
+    product_id INT NOT NULL,
+    total_quantity INT,
+    total_sale_amount DECIMAL(14, 2),
+    PRIMARY KEY (week_start, product_id)
+);
+
+-- Monthly rollup of daily_sales
+CREATE TABLE IF NOT EXISTS monthly_sales (
+    month_start DATE NOT NULL,
+    product_id INT NOT NULL,
+    total_quantity INT,
+    total_sale_amount DECIMAL(14, 2),
+    PRIMARY KEY (month_start, product_id)
+);
+
+-- Source fingerprints stored with the last load, per source and sale_date partition
+-- ('*' holds the whole-file fingerprint of the CSV)
+CREATE TABLE IF NOT EXISTS etl_fingerprints (
+    source VARCHAR(16) NOT NULL,
+    partition_key VARCHAR(10) NOT NULL,
+    fingerprint TEXT NOT NULL,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    PRIMARY KEY (source, partition_key)
+);
+
+-- Queue of ETL runs requested through the API and executed by the etl-worker service
+CREATE TABLE IF NOT EXISTS etl_jobs (
+    job_id BIGINT AUTO_INCREMENT PRIMARY KEY,
+    mode VARCHAR(16) NOT NULL,
+    start_date DATE NULL,
+    end_date DATE NULL,
+    force_rebuild BOOLEAN NOT NULL DEFAULT FALSE,
+    status VARCHAR(16) NOT NULL,
+    worker VARCHAR(64) NULL,
+    result TEXT NULL,
+    error TEXT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    started_at TIMESTAMP NULL,
+    finished_at TIMESTAMP NULL,
+    -- Runs failing on a transient database error are requeued, resuming after run_after
+    attempts INT NOT NULL DEFAULT 0,
+    run_after TIMESTAMP NULL,
+    KEY idx_etl_jobs_status (status, job_id)
+);
+
+-- Progress of staged loads: rows committed per staging table, and whether the load
+-- was applied, so a retried load resumes after its last committed batch
+CREATE TABLE IF NOT EXISTS etl_load_progress (
+    load_id CHAR(12) NOT NULL,
+    table_name VARCHAR(64) NOT NULL,
+    rows_staged INT NOT NULL DEFAULT 0,
+    applied BOOLEAN NOT NULL DEFAULT FALSE,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    PRIMARY KEY (load_id, table_name)
 );
 
 -- Optional: Create a user with necessary privileges
@@ -1,195 +1,372 @@
-from flask import Flask, jsonify, request
+from flask import Flask, Response, jsonify, request, stream_with_context
 from flask_cors import CORS
-import mysql.connector
-import pandas as pd
-import psycopg2
-from datetime import datetime
-import json
+from datetime import datetime, timedelta
+from collections import OrderedDict
+import importlib.util
+import itertools
+import threading
+import time
+
+# The ETL engine lives in the shared retail_etl package; it is configured through the
+# RETAIL_ETL_* environment variables set in docker-compose. pandas and the database
+# drivers are imported inside the functions that use them, so the API starts serving
+# without paying for them up front
+from retail_etl import mysql_sink, cdc_bootstrapped, period_start, period_end, enqueue_job, get_job, JOB_MODE_FULL, JOB_MODE_INCREMENTAL
 
 app = Flask(__name__)
 CORS(app)
 
-# Reuse the ETL functions from your first assignment
-def extract_postgres_data(execution_date=None):
-    """Extract data from PostgreSQL database"""
-    print("Extracting data from PostgreSQL...")
-    
-    # Connect to PostgreSQL
-    conn = psycopg2.connect(
-        host="postgres-db",  # Use the service name from docker-compose
-        database="retail",
-        user="postgres",
-        password="postgres_password"  # Replace with your actual password in production
-    )
-    
-    # Prepare query
-    if execution_date:
-        query = f"SELECT product_id, quantity, sale_amount, sale_date FROM online_sales WHERE sale_date = '{execution_date}'"
-    else:
-        query = "SELECT product_id, quantity, sale_amount, sale_date FROM online_sales"
-    
-    # Execute query and fetch data
-    df = pd.read_sql(query, conn)
-    conn.close()
-    
-    print(f"Extracted {len(df)} rows from PostgreSQL")
-    return df
-
-def extract_csv_data(csv_path, execution_date=None):
-    """Extract data from CSV file"""
-    print(f"Extracting data from CSV: {csv_path}")
-    
-    # Read CSV file
-    df = pd.read_csv(csv_path)
-    
-    # Filter by date if provided
-    if execution_date:
-        df = df[df['sale_date'] == execution_date]
-    
-    print(f"Extracted {len(df)} rows from CSV")
-    return df
-
-def transform_data(postgres_df, csv_df):
-    """Transform and aggregate the data"""
-    print("Transforming data...")
-    
-    # Combine data from both sources
-    df_combined = pd.concat([postgres_df, csv_df], ignore_index=True)
-    
-    # Data cleansing - remove null or invalid entries
-    df_combined = df_combined.dropna()
-    
-    # Ensure numeric types
-    df_combined['quantity'] = pd.to_numeric(df_combined['quantity'], errors='coerce')
-    df_combined['sale_amount'] = pd.to_numeric(df_combined['sale_amount'], errors='coerce')
-    df_combined = df_combined.dropna()
-    
-    # Aggregate data to calculate totals for each product_id
-    df_aggregated = df_combined.groupby('product_id').agg({
-        'quantity': 'sum',
-        'sale_amount': 'sum'
-    }).reset_index()
-    
-    # Rename columns to match the target schema
-    df_aggregated.columns = ['product_id', 'total_quantity', 'total_sale_amount']
-    
-    print(f"Transformed data to {len(df_aggregated)} aggregated rows")
-    return df_aggregated
-
-def load_to_mysql(df_aggregated):
-    """Load data to MySQL"""
-    print("Loading data to MySQL...")
-    
-    # Connect to MySQL
-    conn = mysql.connector.connect(
-        host="mysql-db",  # Use the service name from docker-compose
-        database="retail_dw",
-        user="mysql",
-        password="mysql_password"  # Replace with your actual password in production
-    )
-    cursor = conn.cursor()
-    
-    # Get list of product IDs
-    product_ids = df_aggregated['product_id'].tolist()
-    product_ids_str = ', '.join(str(id) for id in product_ids)
-    
-    # Delete existing records for these products
-    if product_ids:
-        delete_query = f"DELETE FROM aggregated_sales WHERE product_id IN ({product_ids_str})"
-        cursor.execute(delete_query)
-    
-    # Insert the aggregated data
-    insert_query = """
-    INSERT INTO aggregated_sales (product_id, total_quantity, total_sale_amount)
-    VALUES (%s, %s, %s)
-    """
+# /sales content types; the binary formats are offered only when their library is installed
+SALES_QUERY = "SELECT product_id, total_quantity, total_sale_amount FROM aggregated_sales"
+# The binary formats read the amount as DOUBLE so the driver returns floats, not Decimal objects
+BINARY_SALES_QUERY = "SELECT product_id, total_quantity, CAST(total_sale_amount AS DOUBLE) FROM aggregated_sales"
+JSON_MIMETYPE = 'application/json'
+ARROW_MIMETYPE = 'application/vnd.apache.arrow.stream'
+MSGPACK_MIMETYPE = 'application/x-msgpack'
+SALES_BATCH_ROWS = 65536  # rows per Arrow record batch
+SALES_MAX_AGE = 5  # seconds the load balancer's micro-cache (and clients) may reuse a /sales response
+
+def sales_mimetypes():
+    """Return the content types /sales can produce here, JSON first"""
+    offers = [JSON_MIMETYPE]
+    if importlib.util.find_spec('pyarrow'):
+        offers.append(ARROW_MIMETYPE)
+    if importlib.util.find_spec('msgpack'):
+        offers.append(MSGPACK_MIMETYPE)
+    return offers
+
+class ChunkBuffer:
+    """Write-only file object collecting what has been written since the last drain()"""
     
-    # Prepare the data for insertion
-    data = [
-        (int(row['product_id']), int(row['total_quantity']), float(row['total_sale_amount']))
-        for _, row in df_aggregated.iterrows()
-    ]
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+        self.closed = False
     
-    # Execute insert
-    cursor.executemany(insert_query, data)
-    conn.commit()
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
     
-    print(f"Inserted {len(data)} rows into MySQL")
+    def tell(self):
+        return self.position
     
-    # Close connection
-    cursor.close()
-    conn.close()
-
-def run_etl_pipeline(csv_path, execution_date=None):
-    """Run the complete ETL pipeline"""
-    print(f"Starting ETL pipeline at {datetime.now()}")
-    print(f"Processing date: {execution_date if execution_date else 'all dates'}")
+    def flush(self):
+        pass
     
-    # Extract
-    postgres_data = extract_postgres_data(execution_date)
-    csv_data = extract_csv_data(csv_path, execution_date)
+    def close(self):
+        self.closed = True
     
-    # Transform
-    transformed_data = transform_data(postgres_data, csv_data)
+    def drain(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+def stream_sales_arrow():
+    """Yield aggregated_sales as an Arrow IPC stream, one record batch per fetched chunk"""
+    import pyarrow as pa
+    schema = pa.schema([
+        ('product_id', pa.int64()),
+        ('total_quantity', pa.int64()),
+        ('total_sale_amount', pa.float64()),
+    ])
     
-    # Load
-    load_to_mysql(transformed_data)
+    # Read the whole result and end the transaction before sending anything: a read left open
+    # at the client's pace would hold the metadata lock on aggregated_sales, and a swap load's
+    # RENAME waiting for it would queue every other read of the table behind it
+    with mysql_sink().connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(BINARY_SALES_QUERY)
+        rows = cursor.fetchall()
+        cursor.close()
+        conn.commit()
     
-    print(f"ETL pipeline completed at {datetime.now()}")
-    return True
+    # Each batch goes out as soon as it is encoded
+    buffer = ChunkBuffer()
+    writer = pa.ipc.new_stream(pa.PythonFile(buffer, mode='w'), schema)
+    yield buffer.drain()
+    for offset in range(0, len(rows), SALES_BATCH_ROWS):
+        batch = rows[offset:offset + SALES_BATCH_ROWS]
+        columns = [pa.array(values, type=field.type) for values, field in zip(zip(*batch), schema)]
+        writer.write_batch(pa.record_batch(columns, schema=schema))
+        yield buffer.drain()
+    writer.close()
+    yield buffer.drain()
 
 # API endpoints
 @app.route('/sales', methods=['GET'])
 def get_sales():
+    # Content negotiation: JSON unless the client prefers (and we have) a binary format
+    offers = sales_mimetypes()
+    mimetype = request.accept_mimetypes.best_match(offers) if request.accept_mimetypes else JSON_MIMETYPE
+    if mimetype is None:
+        return jsonify({"error": "Not acceptable", "supported": offers}), 406
+    
     try:
-        # Connect to MySQL
-        conn = mysql.connector.connect(
-            host="mysql-db",  # Use the service name from docker-compose
-            database="retail_dw",
-            user="mysql",
-            password="mysql_password"  # Replace with your actual password in production
-        )
+        if mimetype == ARROW_MIMETYPE:
+            # Start the stream here so connection and query errors still return a 500
+            chunks = stream_sales_arrow()
+            schema_bytes = next(chunks)
+            body = itertools.chain([schema_bytes], chunks)
+            response = Response(stream_with_context(body), mimetype=ARROW_MIMETYPE)
+        elif mimetype == MSGPACK_MIMETYPE:
+            import msgpack
+            with mysql_sink().connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute(BINARY_SALES_QUERY)
+                rows = cursor.fetchall()
+                cursor.close()
+            sales_data = [
+                {"product_id": pid, "total_quantity": quantity, "total_sale_amount": amount}
+                for pid, quantity, amount in rows
+            ]
+            response = Response(msgpack.packb(sales_data), mimetype=MSGPACK_MIMETYPE)
+        else:
+            import pandas as pd
+            
+            # Execute query and fetch data over a pooled warehouse connection
+            with mysql_sink().connection() as conn:
+                df = pd.read_sql(SALES_QUERY, conn)
+            
+            # Convert to JSON
+            sales_data = df.to_dict(orient='records')
+            response = jsonify(sales_data)
+        response.headers['Vary'] = 'Accept'
+        response.cache_control.public = True
+        response.cache_control.max_age = SALES_MAX_AGE
+        
+        # Buffered bodies get a content ETag, so revalidations that match are answered with a 304
+        if not response.is_streamed:
+            response.add_etag()
+            response.make_conditional(request)
+        return response
+    
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+# Range queries are answered from the coarsest rollup that fits: (grain, table, key column)
+RANGE_GRAINS = [
+    ('month', 'monthly_sales', 'month_start'),
+    ('week', 'weekly_sales', 'week_start'),
+]
+RANGE_CACHE_SIZE = 256
+RANGE_CACHE_TTL = 60  # seconds; bounds staleness after an ETL run on another replica
+RANGE_QUERY_TIMEOUT_MS = 2000
+
+# LRU cache of recent range results: (from, to, product_id) -> (cached_at, rows)
+range_cache = OrderedDict()
+range_cache_lock = threading.Lock()
+
+def plan_range_query(start, end):
+    """Cover [start, end] with whole months, then whole weeks, then single days"""
+    segments = []
+    day = start
+    while day <= end:
+        for grain, table, key in RANGE_GRAINS:
+            if period_start(day, grain) == day and period_end(day, grain) - timedelta(days=1) <= end:
+                next_day = period_end(day, grain)
+                break
+        else:
+            table, key, next_day = 'daily_sales', 'sale_date', day + timedelta(days=1)
+        
+        # Consecutive periods of the same grain collapse into one BETWEEN range
+        if segments and segments[-1][0] == table:
+            segments[-1][3] = day
+        else:
+            segments.append([table, key, day, day])
+        day = next_day
+    return segments
+
+def query_sales_range(start, end, product_id=None):
+    """Sum the rollup segments covering [start, end] per product_id"""
+    parts = []
+    params = []
+    for table, key, first, last in plan_range_query(start, end):
+        where = f"{key} BETWEEN %s AND %s"
+        params.extend([first, last])
+        if product_id is not None:
+            where += " AND product_id = %s"
+            params.append(product_id)
+        parts.append(f"SELECT product_id, total_quantity, total_sale_amount FROM {table} WHERE {where}")
+    
+    query = f"""
+    SELECT /*+ MAX_EXECUTION_TIME({RANGE_QUERY_TIMEOUT_MS}) */
+        product_id, SUM(total_quantity), SUM(total_sale_amount)
+    FROM ({' UNION ALL '.join(parts)}) AS periods
+    GROUP BY product_id
+    ORDER BY product_id
+    """
+    
+    with mysql_sink().connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(query, params)
+        rows = [
+            {"product_id": int(pid), "total_quantity": int(quantity), "total_sale_amount": float(amount)}
+            for pid, quantity, amount in cursor.fetchall()
+        ]
+        cursor.close()
+    return rows
+
+@app.route('/sales/range', methods=['GET'])
+def get_sales_range():
+    try:
+        start = datetime.strptime(request.args['from'], '%Y-%m-%d').date()
+        end = datetime.strptime(request.args['to'], '%Y-%m-%d').date()
+        product_id = request.args.get('product_id', type=int)
+    except (KeyError, ValueError):
+        return jsonify({"error": "'from' and 'to' are required as YYYY-MM-DD; 'product_id' must be an integer"}), 400
+    if start > end:
+        return jsonify({"error": "'from' must not be after 'to'"}), 400
+    
+    try:
+        key = (start, end, product_id)
+        with range_cache_lock:
+            entry = range_cache.get(key)
+            if entry and time.monotonic() - entry[0] < RANGE_CACHE_TTL:
+                range_cache.move_to_end(key)
+                response = jsonify(entry[1])
+                response.headers['X-Cache'] = 'HIT'
+                return response
+        
+        rows = query_sales_range(start, end, product_id)
         
-        # Execute query and fetch data
-        query = "SELECT product_id, total_quantity, total_sale_amount FROM aggregated_sales"
-        df = pd.read_sql(query, conn)
-        conn.close()
+        with range_cache_lock:
+            range_cache[key] = (time.monotonic(), rows)
+            range_cache.move_to_end(key)
+            while len(range_cache) > RANGE_CACHE_SIZE:
+                range_cache.popitem(last=False)
         
-        # Convert to JSON
-        sales_data = df.to_dict(orient='records')
-        return jsonify(sales_data)
+        response = jsonify(rows)
+        response.headers['X-Cache'] = 'MISS'
+        return response
     
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+# Ranked queries are index-only scans of aggregated_sales: ?by= -> (ranked column, covering index)
+RANKED_COLUMNS = {
+    'revenue': ('total_sale_amount', 'idx_aggregated_sales_revenue'),
+    'quantity': ('total_quantity', 'idx_aggregated_sales_quantity'),
+}
+RANKED_DEFAULT_LIMIT = 10
+RANKED_MAX_LIMIT = 1000
+
+def query_ranked_sales(by, minimum=None, limit=RANKED_DEFAULT_LIMIT):
+    """Return the top products by the ranked column, optionally only those at or above minimum"""
+    column, index = RANKED_COLUMNS[by]
+    where = f"WHERE {column} >= %s" if minimum is not None else ""
+    params = ([minimum] if minimum is not None else []) + [limit]
+    
+    # The index is ordered by the ranked column, so the scan stops after limit entries
+    query = f"""
+    SELECT /*+ MAX_EXECUTION_TIME({RANGE_QUERY_TIMEOUT_MS}) */
+        product_id, total_quantity, CAST(total_sale_amount AS DOUBLE)
+    FROM aggregated_sales FORCE INDEX ({index})
+    {where}
+    ORDER BY {column} DESC
+    LIMIT %s
+    """
+    with mysql_sink().connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(query, params)
+        rows = [
+            {"product_id": pid, "total_quantity": quantity, "total_sale_amount": amount}
+            for pid, quantity, amount in cursor.fetchall()
+        ]
+        cursor.close()
+    return rows
+
+@app.route('/sales/top', methods=['GET'])
+def get_sales_top():
+    by = request.args.get('by', 'revenue')
+    limit = request.args.get('limit', RANKED_DEFAULT_LIMIT, type=int)
+    if by not in RANKED_COLUMNS or not 1 <= limit <= RANKED_MAX_LIMIT:
+        return jsonify({"error": f"'by' must be one of {sorted(RANKED_COLUMNS)}; 'limit' must be 1..{RANKED_MAX_LIMIT}"}), 400
+    
+    try:
+        return jsonify(query_ranked_sales(by, limit=limit))
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/sales/above', methods=['GET'])
+def get_sales_above():
+    min_quantity = request.args.get('min_quantity', type=int)
+    min_revenue = request.args.get('min_revenue', type=float)
+    limit = request.args.get('limit', RANKED_MAX_LIMIT, type=int)
+    if (min_quantity is None) == (min_revenue is None) or not 1 <= limit <= RANKED_MAX_LIMIT:
+        return jsonify({"error": f"Pass exactly one of 'min_quantity' (integer) or 'min_revenue' (number); 'limit' must be 1..{RANKED_MAX_LIMIT}"}), 400
+    
+    try:
+        if min_quantity is not None:
+            rows = query_ranked_sales('quantity', min_quantity, limit)
+        else:
+            rows = query_ranked_sales('revenue', min_revenue, limit)
+        return jsonify(rows)
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
 @app.route('/run-etl', methods=['POST'])
 def api_run_etl():
     try:
-        # CSV file path
-        csv_file_path = "/app/in_store_sales.csv"
-        
-        # Run the ETL pipeline
-        success = run_etl_pipeline(csv_file_path)
-        
-        if success:
+        # Queue the run for the etl-worker service; ?mode=incremental applies only the captured changes,
+        # ?from=YYYY-MM-DD[&to=YYYY-MM-DD] limits the run to a date range
+        # and ?force=1 rebuilds everything regardless of the source fingerprints
+        start = request.args.get('from')
+        end = request.args.get('to') if start else None
+        try:
+            if start and datetime.strptime(start, '%Y-%m-%d') > datetime.strptime(end or start, '%Y-%m-%d'):
+                raise ValueError
+        except ValueError:
             return jsonify({
-                "success": True,
-                "message": "ETL pipeline executed successfully",
-                "details": f"Completed at {datetime.now()}"
-            })
-        else:
+                "success": False,
+                "message": "Invalid date range",
+                "details": "'from' and 'to' must be YYYY-MM-DD with 'from' not after 'to'"
+            }), 400
+        if start and request.args.get('mode') != 'incremental' and cdc_bootstrapped():
+            # Captured changes for the range would be applied again by the next incremental run
             return jsonify({
                 "success": False,
-                "message": "ETL pipeline failed",
-                "details": "Check logs for more information"
-            })
+                "message": "Date range runs are disabled while change capture is active",
+                "details": "Run a full load, or ?mode=incremental to apply the captured changes"
+            }), 409
+        if request.args.get('mode') == 'incremental':
+            job_id = enqueue_job(JOB_MODE_INCREMENTAL)
+        else:
+            job_id = enqueue_job(JOB_MODE_FULL, start, end, force=request.args.get('force') == '1')
+        
+        # Range results cached by the replicas expire within RANGE_CACHE_TTL of the run finishing
+        response = jsonify({
+            "success": True,
+            "message": "ETL pipeline run queued",
+            "details": f"Job {job_id} queued at {datetime.now()}",
+            "job_id": job_id,
+            "status_url": f"/etl-jobs/{job_id}"
+        })
+        response.status_code = 202
+        response.headers['Location'] = f"/etl-jobs/{job_id}"
+        return response
     
     except Exception as e:
         return jsonify({
             "success": False,
-            "message": "Error executing ETL pipeline",
+            "message": "Error queueing ETL pipeline run",
             "details": str(e)
         }), 500
 
+@app.route('/etl-jobs/<int:job_id>', methods=['GET'])
+def api_etl_job(job_id):
+    try:
+        job = get_job(job_id)
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+    if job is None:
+        return jsonify({"error": f"No ETL job {job_id}"}), 404
+    
+    # Dates and timestamps as ISO strings
+    for key in ('start_date', 'end_date', 'created_at', 'started_at', 'finished_at', 'run_after'):
+        if job[key] is not None:
+            job[key] = job[key].isoformat()
+    return jsonify(job)
+
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=5001) 
\ No newline at end of file
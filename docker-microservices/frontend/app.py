@@ -1,4 +1,4 @@
-from flask import Flask, render_template, request
+from flask import Flask, render_template, request, redirect, url_for
 import requests
 import json
 
@@ -20,11 +20,41 @@ def index():
 @app.route('/run-etl', methods=['POST'])
 def run_etl():
     try:
+        # The API queues the run for the ETL worker and answers right away
         response = requests.post(f'http://{API_HOST}:{API_PORT}/run-etl')
         result = response.json()
+        if response.status_code == 202:
+            return redirect(url_for('etl_job', job_id=result['job_id']))
         return render_template('etl_result.html', result=result)
     except requests.exceptions.RequestException as e:
         return render_template('error.html', error=str(e))
 
+@app.route('/etl-jobs/<int:job_id>')
+def etl_job(job_id):
+    try:
+        response = requests.get(f'http://{API_HOST}:{API_PORT}/etl-jobs/{job_id}')
+        job = response.json()
+        if response.status_code != 200:
+            return render_template('error.html', error=job.get('error'))
+    except requests.exceptions.RequestException as e:
+        return render_template('error.html', error=str(e))
+    
+    # Shape the job like the old synchronous result; the page refreshes itself until the run ends
+    result = {"success": job['status'] == 'succeeded', "pending": job['status'] in ('queued', 'running'), "job_id": job_id}
+    if result['pending']:
+        result['message'] = f"ETL pipeline run is {job['status']}"
+        result['details'] = f"Job {job_id} queued at {job['created_at']}"
+        if job['status'] == 'queued' and job.get('attempts'):
+            result['details'] = f"Job {job_id} will resume after a transient error: {job['error']}"
+    elif result['success']:
+        result['message'] = ("Sources unchanged since the last run, nothing to reload" if job['result'].get('skipped')
+                             else "ETL pipeline executed successfully")
+        result['details'] = f"Completed at {job['finished_at']}"
+        result['rejected_rows'] = job['result'].get('rejected_rows')
+    else:
+        result['message'] = "ETL pipeline failed"
+        result['details'] = job['error']
+    return render_template('etl_result.html', result=result)
+
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=5000) 
\ No newline at end of file
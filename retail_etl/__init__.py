@@ -0,0 +1,33 @@
+"""
+retail_etl: the ETL engine shared by the Airflow DAGs, the backend API and the command line.
+
+Extracts sales from PostgreSQL and the in-store CSV, validates and aggregates them to daily
+facts, and loads those (with weekly/monthly rollups) into the MySQL data warehouse.
+Connection settings come from EtlConfig, see retail_etl.config.
+"""
+
+from retail_etl.config import EtlConfig, get_config, configure
+from retail_etl.connectors import PostgresSource, MySQLSink, postgres_source, mysql_sink, set_connectors, reset_connectors
+from retail_etl.extract import extract_postgres_data, extract_csv_data
+from retail_etl.transform import DQ_RULES, transform_data
+from retail_etl.load import LOAD_MODE_REPLACE, LOAD_MODE_SWAP, LOAD_MODE_DELTA, period_start, period_end, load_to_mysql, has_daily_facts, cdc_bootstrapped
+from retail_etl.pipeline import run_etl_pipeline, run_incremental_pipeline, follow_csv
+from retail_etl.jobs import (
+    JOB_QUEUED, JOB_RUNNING, JOB_SUCCEEDED, JOB_FAILED, JOB_MODE_FULL, JOB_MODE_INCREMENTAL,
+    enqueue_job, get_job, run_worker,
+)
+from retail_etl.migrations import migrate
+from retail_etl.retry import is_transient, retry_transient
+
+__all__ = [
+    'EtlConfig', 'get_config', 'configure',
+    'PostgresSource', 'MySQLSink', 'postgres_source', 'mysql_sink', 'set_connectors', 'reset_connectors',
+    'extract_postgres_data', 'extract_csv_data',
+    'DQ_RULES', 'transform_data',
+    'LOAD_MODE_REPLACE', 'LOAD_MODE_SWAP', 'LOAD_MODE_DELTA', 'period_start', 'period_end', 'load_to_mysql', 'has_daily_facts', 'cdc_bootstrapped',
+    'run_etl_pipeline', 'run_incremental_pipeline', 'follow_csv',
+    'JOB_QUEUED', 'JOB_RUNNING', 'JOB_SUCCEEDED', 'JOB_FAILED', 'JOB_MODE_FULL', 'JOB_MODE_INCREMENTAL',
+    'enqueue_job', 'get_job', 'run_worker',
+    'migrate',
+    'is_transient', 'retry_transient',
+]
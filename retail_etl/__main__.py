@@ -0,0 +1,39 @@
+"""
+Command line entry point: python -m retail_etl [--date YYYY-MM-DD [--end-date YYYY-MM-DD]] [--incremental | --follow | --worker | --migrate]
+"""
+
+import argparse
+
+from retail_etl.pipeline import run_etl_pipeline, run_incremental_pipeline, follow_csv
+from retail_etl.jobs import run_worker
+from retail_etl.migrations import migrate
+
+def main(argv=None):
+    """Run the pipeline as requested on the command line"""
+    parser = argparse.ArgumentParser(prog='retail-etl', description='Load retail sales into the MySQL data warehouse')
+    parser.add_argument('--csv', default='in_store_sales.csv', help='path of the in-store sales CSV')
+    parser.add_argument('--date', help='only reload this sale date (YYYY-MM-DD)')
+    parser.add_argument('--end-date', help='with --date, reload the inclusive range up to this date')
+    parser.add_argument('--force', action='store_true', help='rebuild even if the sources look unchanged')
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument('--incremental', action='store_true', help='apply captured changes and appended CSV rows')
+    mode.add_argument('--follow', action='store_true', help='keep applying appended CSV rows and captured changes as they arrive')
+    mode.add_argument('--worker', action='store_true', help='execute the runs queued in etl_jobs')
+    mode.add_argument('--migrate', action='store_true', help='apply pending warehouse schema migrations and exit')
+    args = parser.parse_args(argv)
+    
+    if args.end_date and not args.date:
+        parser.error('--end-date requires --date')
+    if args.follow:
+        follow_csv(args.csv)
+    elif args.worker:
+        run_worker(args.csv)
+    elif args.migrate:
+        migrate()
+    elif args.incremental:
+        run_incremental_pipeline(args.csv)
+    else:
+        run_etl_pipeline(args.csv, args.date, force=args.force, end_date=args.end_date)
+
+if __name__ == "__main__":
+    main()
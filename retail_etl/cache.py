@@ -0,0 +1,84 @@
+"""
+On-disk cache of per-(source, sale_date) partial aggregates, keyed by the partition fingerprint.
+"""
+
+import os
+import json
+import hashlib
+
+from retail_etl.config import get_config
+
+# Bump whenever validation or aggregation changes so older partials stop matching, and
+# warehouses loaded under the old rules are rebuilt (it is part of dq_settings_digest)
+AGGREGATE_CACHE_VERSION = 2
+
+def dq_settings_digest():
+    """Return a short digest of the configurable data-quality rules the partials were validated with"""
+    config = get_config()
+    settings = {'version': AGGREGATE_CACHE_VERSION, 'min_sale_date': config.dq_min_sale_date,
+                'known_product_ids': sorted(config.known_product_ids)}
+    return hashlib.sha1(json.dumps(settings, sort_keys=True).encode()).hexdigest()[:16]
+
+def aggregate_cache_key(fingerprint):
+    """Return the short cache key of a partition fingerprint under the current data-quality rules"""
+    return hashlib.sha1(f"{dq_settings_digest()}:{fingerprint}".encode()).hexdigest()[:16]
+
+def aggregate_cache_index():
+    """Return the cached partials as {(source, sale_date): (cache key, path)}"""
+    cache_dir = get_config().aggregate_cache_dir
+    index = {}
+    if os.path.isdir(cache_dir):
+        for name in os.listdir(cache_dir):
+            if name.endswith('.pkl'):
+                # in_store_2024-03-01_<key>.pkl - the source itself may contain underscores
+                source, day, key = name[:-len('.pkl')].rsplit('_', 2)
+                index[(source, day)] = (key, os.path.join(cache_dir, name))
+    return index
+
+def uncached_partitions(fingerprints, cache_index, source, dates):
+    """Return the dates that have source rows but no cached partial for their current fingerprint"""
+    return {
+        day for day in dates
+        if day in fingerprints and cache_index.get((source, day), (None,))[0] != aggregate_cache_key(fingerprints[day])
+    }
+
+def save_aggregate_partials(partials, fingerprints, cache_index):
+    """Cache the partial aggregate of each (source, sale_date) in fingerprints, replacing older versions"""
+    cache_dir = get_config().aggregate_cache_dir
+    os.makedirs(cache_dir, exist_ok=True)
+    groups = dict(tuple(partials.groupby(['source', partials['sale_date'].dt.strftime('%Y-%m-%d')])))
+    for (source, day), fingerprint in fingerprints.items():
+        # A partition whose rows were all rejected is cached empty so it isn't reread either
+        rows = groups.get((source, day), partials.iloc[0:0])
+        path = os.path.join(cache_dir, f"{source}_{day}_{aggregate_cache_key(fingerprint)}.pkl")
+        rows.to_pickle(path + '.tmp')
+        os.replace(path + '.tmp', path)
+        previous = cache_index.get((source, day))
+        if previous and previous[1] != path and os.path.exists(previous[1]):
+            os.remove(previous[1])
+        cache_index[(source, day)] = (aggregate_cache_key(fingerprint), path)
+
+def load_aggregate_partials(paths):
+    """Read cached partials, marking each as recently used"""
+    import pandas as pd
+    frames = []
+    for path in paths:
+        frames.append(pd.read_pickle(path))
+        os.utime(path)
+    return frames
+
+def evict_aggregate_cache():
+    """Delete the least recently used partials until the cache fits aggregate_cache_max_bytes"""
+    config = get_config()
+    if not os.path.isdir(config.aggregate_cache_dir):
+        return
+    entries = []
+    for name in os.listdir(config.aggregate_cache_dir):
+        stat = os.stat(os.path.join(config.aggregate_cache_dir, name))
+        entries.append((stat.st_mtime, stat.st_size, name))
+    total = sum(size for _, size, _ in entries)
+    for _, size, name in sorted(entries):
+        if total <= config.aggregate_cache_max_bytes:
+            break
+        os.remove(os.path.join(config.aggregate_cache_dir, name))
+        total -= size
@@ -0,0 +1,59 @@
+"""
+On-disk checkpoints of completed pipeline stages, keyed by run id, so a retried run resumes
+after the last stage it finished instead of extracting and transforming again.
+"""
+
+import os
+import re
+import time
+import pickle
+
+from retail_etl.config import get_config
+
+def checkpoint_prefix(run_id):
+    """Return the file name prefix of a run's checkpoints"""
+    return re.sub(r'[^\w-]', '_', run_id) + '.'
+
+def checkpoint_path(run_id, stage):
+    """Return the file holding a run's checkpoint for stage"""
+    return os.path.join(get_config().checkpoint_dir, f"{checkpoint_prefix(run_id)}{stage}.pkl")
+
+def save_checkpoint(run_id, stage, state):
+    """Persist the output of a completed stage (any picklable object)"""
+    path = checkpoint_path(run_id, stage)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path + '.tmp', 'wb') as f:
+        pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(path + '.tmp', path)
+
+def has_checkpoint(run_id, stage):
+    """Return whether the run has a checkpoint for stage"""
+    return os.path.exists(checkpoint_path(run_id, stage))
+
+def load_checkpoint(run_id, stage):
+    """Return the checkpointed output of stage for this run, or None"""
+    path = checkpoint_path(run_id, stage)
+    if not os.path.exists(path):
+        return None
+    with open(path, 'rb') as f:
+        return pickle.load(f)
+
+def clear_checkpoints(run_id):
+    """Delete every checkpoint of a run"""
+    prefix = checkpoint_prefix(run_id)
+    checkpoint_dir = get_config().checkpoint_dir
+    if os.path.isdir(checkpoint_dir):
+        for name in os.listdir(checkpoint_dir):
+            if name.startswith(prefix):
+                os.remove(os.path.join(checkpoint_dir, name))
+
+def purge_stale_checkpoints():
+    """Delete the checkpoints of runs abandoned for longer than checkpoint_max_age"""
+    config = get_config()
+    if not os.path.isdir(config.checkpoint_dir):
+        return
+    cutoff = time.time() - config.checkpoint_max_age
+    for name in os.listdir(config.checkpoint_dir):
+        path = os.path.join(config.checkpoint_dir, name)
+        if os.stat(path).st_mtime < cutoff:
+            os.remove(path)
@@ -0,0 +1,100 @@
+"""
+Runtime configuration for the retail ETL engine.
+
+Every setting can be overridden with a RETAIL_ETL_<FIELD> environment variable,
+e.g. RETAIL_ETL_POSTGRES_HOST=postgres-db or RETAIL_ETL_LOAD_BATCH_SIZE=20000.
+"""
+
+import os
+import threading
+from dataclasses import dataclass, fields, replace
+
+ENV_PREFIX = 'RETAIL_ETL_'
+
+@dataclass(frozen=True)
+class EtlConfig:
+    """Connection settings, pool sizes and batch sizes for one deployment"""
+    # Source: online_sales in PostgreSQL
+    postgres_host: str = 'localhost'
+    postgres_port: int = 5432
+    postgres_db: str = 'retail'
+    postgres_user: str = 'postgres'
+    postgres_password: str = '198277'
+    postgres_pool_size: int = 4
+
+    # Sink: the MySQL data warehouse
+    mysql_host: str = 'localhost'
+    mysql_port: int = 3306
+    mysql_db: str = 'retail_dw'
+    mysql_user: str = 'mysql'
+    mysql_password: str = 'mysql'
+    mysql_pool_size: int = 4
+
+    # Seconds a borrower waits for a free pooled connection before giving up
+    pool_timeout: float = 30.0
+
+    # Rows per multi-row INSERT, and captured changes applied per incremental run
+    load_batch_size: int = 5000
+    cdc_chunk_size: int = 100000
+
+    # ETL worker: seconds between polls of an empty etl_jobs queue, and how long a
+    # run may stay 'running' before it is presumed lost with its worker
+    worker_poll_interval: float = 2.0
+    job_timeout: int = 3600
+
+    # Transient database errors: attempts per operation, and the exponential backoff
+    # between them (seconds, doubling from the base up to the max); a job failing on
+    # one is requeued up to job_max_attempts times, resuming from its checkpoints
+    retry_attempts: int = 5
+    retry_base_delay: float = 1.0
+    retry_max_delay: float = 60.0
+    job_max_attempts: int = 3
+
+    # Data-quality rules: the earliest accepted sale_date, and the catalogue product_ids
+    # (comma-separated in the environment; empty accepts any positive id)
+    dq_min_sale_date: str = '2000-01-01'
+    known_product_ids: tuple = ()
+
+    # Local state, relative paths resolve against the working directory; checkpoints
+    # and staged loads of runs that never finish are purged after checkpoint_max_age seconds
+    quarantine_dir: str = 'quarantine'
+    aggregate_cache_dir: str = 'aggregate_cache'
+    aggregate_cache_max_bytes: int = 256 * 1024 * 1024
+    checkpoint_dir: str = 'checkpoints'
+    checkpoint_max_age: int = 86400
+
+    @classmethod
+    def from_env(cls, environ=None):
+        """Build a config from the defaults overridden by RETAIL_ETL_* variables"""
+        environ = os.environ if environ is None else environ
+        values = {}
+        for field in fields(cls):
+            name = ENV_PREFIX + field.name.upper()
+            if name in environ:
+                if isinstance(field.default, tuple):
+                    values[field.name] = tuple(int(value) for value in environ[name].split(',') if value.strip())
+                else:
+                    values[field.name] = type(field.default)(environ[name])
+        return cls(**values)
+
+# Process-wide config, read from the environment on first use
+_config = None
+_config_lock = threading.Lock()
+
+def get_config():
+    """Return the active config"""
+    global _config
+    with _config_lock:
+        if _config is None:
+            _config = EtlConfig.from_env()
+        return _config
+
+def configure(config=None, **overrides):
+    """Replace the active config (or change some of its fields) and drop the pooled connections"""
+    global _config
+    from retail_etl import connectors
+    with _config_lock:
+        base = config or _config or EtlConfig.from_env()
+        _config = replace(base, **overrides)
+    connectors.reset_connectors()
+    return _config
@@ -0,0 +1,162 @@
+"""
+Source and sink connectors for the retail ETL engine.
+
+Each connector hands out pooled connections through connection(), a context manager
+that returns the connection to its pool (rolled back if left mid-transaction) when the
+block exits. Callers that need a different backend can plug in any object with the same
+connection() method through set_connectors().
+"""
+
+import threading
+from contextlib import contextmanager
+
+from retail_etl.config import get_config
+
+class PostgresSource:
+    """The online_sales source database, reached through a thread-safe connection pool"""
+
+    def __init__(self, config):
+        self.config = config
+        self._pool = None
+        self._pool_lock = threading.Lock()
+        # The pool raises instead of waiting when it runs dry, so borrowers queue here first,
+        # for up to pool_timeout seconds
+        self._slots = threading.BoundedSemaphore(config.postgres_pool_size)
+
+    def connect_params(self):
+        """Return the psycopg2.connect() keyword arguments for this database"""
+        return {
+            'host': self.config.postgres_host,
+            'port': self.config.postgres_port,
+            'database': self.config.postgres_db,
+            'user': self.config.postgres_user,
+            'password': self.config.postgres_password,
+        }
+
+    def connect(self, **kwargs):
+        """Open a dedicated connection outside the pool, e.g. over the replication protocol"""
+        import psycopg2
+        return psycopg2.connect(**self.connect_params(), **kwargs)
+
+    @contextmanager
+    def connection(self):
+        """Borrow a pooled connection for the duration of the block"""
+        import psycopg2.pool
+        with self._pool_lock:
+            if self._pool is None:
+                self._pool = psycopg2.pool.ThreadedConnectionPool(
+                    1, self.config.postgres_pool_size, **self.connect_params())
+            pool = self._pool
+
+        if not self._slots.acquire(timeout=self.config.pool_timeout):
+            raise psycopg2.pool.PoolError(f"No pooled PostgreSQL connection free within {self.config.pool_timeout}s")
+        try:
+            conn = pool.getconn()
+            try:
+                yield conn
+            finally:
+                # Connections broken by a server restart are discarded rather than reused
+                pool.putconn(conn, close=bool(conn.closed))
+        finally:
+            self._slots.release()
+
+    def close(self):
+        """Close every pooled connection"""
+        with self._pool_lock:
+            if self._pool is not None:
+                self._pool.closeall()
+                self._pool = None
+
+class MySQLSink:
+    """The MySQL data warehouse, reached through a connection pool"""
+
+    def __init__(self, config):
+        self.config = config
+        self._pool = None
+        self._pool_lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(config.mysql_pool_size)
+
+    def connect_params(self):
+        """Return the mysql.connector.connect() keyword arguments for this database"""
+        return {
+            'host': self.config.mysql_host,
+            'port': self.config.mysql_port,
+            'database': self.config.mysql_db,
+            'user': self.config.mysql_user,
+            'password': self.config.mysql_password,
+        }
+
+    @contextmanager
+    def connection(self):
+        """Borrow a pooled connection for the duration of the block"""
+        import mysql.connector.pooling
+        with self._pool_lock:
+            if self._pool is None:
+                # Returning a connection resets its session, discarding any uncommitted work
+                self._pool = mysql.connector.pooling.MySQLConnectionPool(
+                    pool_name=f"retail_etl_{id(self)}",
+                    pool_size=self.config.mysql_pool_size,
+                    pool_reset_session=True,
+                    **self.connect_params())
+            pool = self._pool
+
+        if not self._slots.acquire(timeout=self.config.pool_timeout):
+            raise mysql.connector.errors.PoolError(f"No pooled MySQL connection free within {self.config.pool_timeout}s")
+        try:
+            conn = pool.get_connection()
+            try:
+                yield conn
+            finally:
+                try:
+                    conn.close()
+                except mysql.connector.Error:
+                    # A connection the server dropped can't reset its session; it is back in
+                    # the pool regardless, reconnects on next use, and the block's own error stands
+                    pass
+        finally:
+            self._slots.release()
+
+    def close(self):
+        """Drop the pool; its idle connections close when it is garbage collected"""
+        with self._pool_lock:
+            self._pool = None
+
+# Connectors for the active config, created on first use
+_source = None
+_sink = None
+_connectors_lock = threading.Lock()
+
+def postgres_source():
+    """Return the connector for the online_sales source"""
+    global _source
+    with _connectors_lock:
+        if _source is None:
+            _source = PostgresSource(get_config())
+        return _source
+
+def mysql_sink():
+    """Return the connector for the warehouse"""
+    global _sink
+    with _connectors_lock:
+        if _sink is None:
+            _sink = MySQLSink(get_config())
+        return _sink
+
+def set_connectors(source=None, sink=None):
+    """Plug in replacement source and/or sink connectors"""
+    global _source, _sink
+    with _connectors_lock:
+        if source is not None:
+            _source = source
+        if sink is not None:
+            _sink = sink
+
+def reset_connectors():
+    """Close the pooled connections so the next use picks up the current config"""
+    global _source, _sink
+    with _connectors_lock:
+        for connector in (_source, _sink):
+            if connector is not None and hasattr(connector, 'close'):
+                connector.close()
+        _source = None
+        _sink = None
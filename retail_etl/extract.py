@@ -0,0 +1,453 @@
+"""
+Extract: online_sales from PostgreSQL (full, per date or as captured changes) and
+the in-store sales CSV (whole, or just the rows appended since the last run).
+"""
+
+import io
+import os
+import re
+import json
+import hashlib
+
+from retail_etl.cache import uncached_partitions
+from retail_etl.config import get_config
+from retail_etl.connectors import postgres_source
+from retail_etl.retry import retry_transient
+
+# Tail-follow state for the append-only CSV, stored next to it
+CSV_STATE_SUFFIX = '.offset.json'
+
+# Change data capture on online_sales: a logical replication slot when the server
+# runs with wal_level=logical, otherwise a trigger-fed change table
+CDC_SLOT_NAME = 'retail_etl_online_sales'
+CDC_CHANGE_TABLE = 'online_sales_changes'
+CDC_COLUMNS = ['sale_id', 'product_id', 'quantity', 'sale_amount', 'sale_date', 'sign']
+
+# Matches one 'column[type]:value' pair in test_decoding output
+CDC_TUPLE_PATTERN = re.compile(r"(\w+)\[[^\]]+\]:('(?:[^']|'')*'|\S+)")
+
+CDC_TRIGGER_SQL = f"""
+CREATE TABLE IF NOT EXISTS {CDC_CHANGE_TABLE} (
+    change_id BIGSERIAL PRIMARY KEY,
+    sign SMALLINT NOT NULL,
+    sale_id INT,
+    product_id INT,
+    quantity INT,
+    sale_amount DECIMAL(10, 2),
+    sale_date DATE
+);
+
+CREATE OR REPLACE FUNCTION capture_online_sales_change() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        INSERT INTO {CDC_CHANGE_TABLE} (sign, sale_id, product_id, quantity, sale_amount, sale_date)
+        VALUES (-1, OLD.sale_id, OLD.product_id, OLD.quantity, OLD.sale_amount, OLD.sale_date);
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        INSERT INTO {CDC_CHANGE_TABLE} (sign, sale_id, product_id, quantity, sale_amount, sale_date)
+        VALUES (1, NEW.sale_id, NEW.product_id, NEW.quantity, NEW.sale_amount, NEW.sale_date);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS online_sales_capture ON online_sales;
+CREATE TRIGGER online_sales_capture
+AFTER INSERT OR UPDATE OR DELETE ON online_sales
+FOR EACH ROW EXECUTE FUNCTION capture_online_sales_change();
+"""
+
+@retry_transient
+def extract_postgres_data(execution_date=None):
+    """Extract data from PostgreSQL database"""
+    import pandas as pd
+    print("Extracting data from PostgreSQL...")
+    
+    # Prepare query
+    query = "SELECT sale_id, product_id, quantity, sale_amount, sale_date FROM online_sales"
+    params = None
+    if execution_date:
+        query += " WHERE sale_date = %(day)s"
+        params = {'day': execution_date}
+    
+    # Execute query and fetch data on a pooled connection
+    with postgres_source().connection() as conn:
+        df = pd.read_sql(query, conn, params=params)
+    
+    print(f"Extracted {len(df)} rows from PostgreSQL")
+    return df
+
+def extract_csv_data(csv_path, execution_date=None):
+    """Extract data from CSV file"""
+    import pandas as pd
+    print(f"Extracting data from CSV: {csv_path}")
+    
+    # Read CSV file
+    df = pd.read_csv(csv_path)
+    
+    # Filter by date if provided
+    if execution_date:
+        df = df[df['sale_date'].astype(str).str.strip() == execution_date]
+    
+    print(f"Extracted {len(df)} rows from CSV")
+    return df
+
+def checksum(data):
+    """Return a short hex digest of a bytes value"""
+    return hashlib.sha1(data).hexdigest()
+
+def extract_csv_tail(csv_path, full=False):
+    """Extract the complete CSV rows appended since the last saved offset, or the whole file"""
+    import pandas as pd
+    print(f"Extracting data from CSV: {csv_path}")
+    state_path = csv_path + CSV_STATE_SUFFIX
+    previous = None
+    if not full and os.path.exists(state_path):
+        with open(state_path) as f:
+            previous = json.load(f)
+    
+    with open(csv_path, 'rb') as f:
+        header = f.readline()
+        size = os.fstat(f.fileno()).st_size
+        
+        # Resume only if the header and the last line we consumed are unchanged,
+        # otherwise the file was truncated or rotated and must be reread in full
+        start = None
+        if previous and previous['header'] == checksum(header) and previous['offset'] <= size:
+            f.seek(previous['tail_start'])
+            if checksum(f.read(previous['offset'] - previous['tail_start'])) == previous['tail']:
+                start = previous['offset']
+        reset = start is None
+        if reset:
+            start = len(header)
+        f.seek(start)
+        chunk = f.read()
+    
+    # A partially written last line waits for the next run, in full reads too, so the
+    # saved offset never points into the middle of a row
+    chunk = chunk[:chunk.rfind(b'\n') + 1]
+    offset = start + len(chunk)
+    
+    if chunk:
+        tail_start = start + chunk.rfind(b'\n', 0, len(chunk) - 1) + 1
+    elif previous and not reset:
+        tail_start = previous['tail_start']
+    else:
+        tail_start = 0
+    with open(csv_path, 'rb') as f:
+        f.seek(tail_start)
+        tail = f.read(offset - tail_start)
+    state = {'offset': offset, 'tail_start': tail_start, 'tail': checksum(tail), 'header': checksum(header)}
+    
+    df = pd.read_csv(io.BytesIO(header + chunk))
+    print(f"Extracted {len(df)} {'rows' if reset else 'appended rows'} from CSV")
+    return df, state, reset
+
+def fingerprint_csv_file(csv_path):
+    """Cheap whole-file fingerprint of the CSV from its size and modification time"""
+    stat = os.stat(csv_path)
+    return f"{stat.st_size}:{stat.st_mtime_ns}"
+
+def sale_date_keys(df):
+    """Return each row's sale_date as a YYYY-MM-DD partition key (NaN when it doesn't parse)"""
+    import pandas as pd
+    return pd.to_datetime(df['sale_date'].astype(str).str.strip(), errors='coerce').dt.strftime('%Y-%m-%d')
+
+def fingerprint_partitions(df):
+    """Return {sale_date: fingerprint} for an extracted frame from row count and a row hash sum"""
+    import pandas as pd
+    hashes = pd.util.hash_pandas_object(df.astype(str), index=False)
+    grouped = hashes.groupby(sale_date_keys(df)).agg(['count', 'sum'])
+    return {day: f"{count}:{total}" for day, count, total in zip(grouped.index, grouped['count'], grouped['sum'])}
+
+def changed_partitions(current, stored, scope=None):
+    """Return the partition keys whose fingerprint differs, limited to scope if given"""
+    keys = set(current) | set(stored)
+    if scope is not None:
+        keys &= set(scope)
+    return {key for key in keys if current.get(key) != stored.get(key)}
+
+def save_csv_state(csv_path, state):
+    """Persist the CSV follow offset once the rows up to it are loaded"""
+    state_path = csv_path + CSV_STATE_SUFFIX
+    with open(state_path + '.tmp', 'w') as f:
+        json.dump(state, f)
+    os.replace(state_path + '.tmp', state_path)
+
+def cdc_mode(cursor):
+    """Return 'slot' or 'table' for the active change capture, or None if it isn't set up"""
+    cursor.execute("SELECT 1 FROM pg_replication_slots WHERE slot_name = %s", (CDC_SLOT_NAME,))
+    if cursor.fetchone():
+        return 'slot'
+    cursor.execute("SELECT to_regclass(%s) IS NOT NULL", (CDC_CHANGE_TABLE,))
+    if cursor.fetchone()[0]:
+        return 'table'
+    return None
+
+def bootstrap_cdc_slot(query):
+    """Create the replication slot and run query against the snapshot it exports
+    
+    Returns the rows, their fingerprints and the slot position they reflect.
+    """
+    import pandas as pd
+    import psycopg2.extras
+    
+    # Slot creation over the replication protocol exports a snapshot that matches
+    # the slot's starting point exactly, so the full load and the change stream line up.
+    # Both connections are dedicated ones: this runs once, while a pooled one is already held.
+    source = postgres_source()
+    repl_conn = source.connect(connection_factory=psycopg2.extras.LogicalReplicationConnection)
+    repl_cursor = repl_conn.cursor()
+    repl_cursor.execute(f"CREATE_REPLICATION_SLOT {CDC_SLOT_NAME} LOGICAL test_decoding EXPORT_SNAPSHOT")
+    _, consistent_point, snapshot_name, _ = repl_cursor.fetchone()
+    
+    conn = source.connect()
+    conn.set_session(isolation_level='REPEATABLE READ')
+    cursor = conn.cursor()
+    cursor.execute("SET TRANSACTION SNAPSHOT %s", (snapshot_name,))
+    fingerprints = fingerprint_postgres(cursor)
+    df = pd.read_sql(query, conn)
+    conn.close()
+    
+    # The exported snapshot stays valid only while the replication connection is open
+    repl_conn.close()
+    print(f"Created replication slot {CDC_SLOT_NAME}")
+    return df, fingerprints, ('slot', consistent_point)
+
+def fingerprint_postgres(cursor, dates=None):
+    """Return {sale_date: fingerprint} for online_sales from row count, max(sale_id) and a row hash sum"""
+    query = """
+    SELECT sale_date::text, COUNT(*), MAX(sale_id),
+           SUM(hashtext(concat_ws(',', sale_id, product_id, quantity, sale_amount))::bigint)
+    FROM online_sales
+    WHERE sale_date IS NOT NULL
+    """
+    params = ()
+    if dates is not None:
+        query += " AND sale_date = ANY(%s::date[])"
+        params = (sorted(dates),)
+    cursor.execute(query + " GROUP BY sale_date", params)
+    return {day: f"{count}:{max_id}:{total}" for day, count, max_id, total in cursor.fetchall()}
+
+@retry_transient
+def extract_postgres_fingerprints(dates=None):
+    """Fingerprint the online_sales partitions (all, or the given sale dates) without extracting any rows"""
+    with postgres_source().connection() as conn:
+        return fingerprint_postgres(conn.cursor(), dates)
+
+@retry_transient
+def extract_postgres_partitions(dates):
+    """Extract the online_sales rows for the given sale dates, plus those without a sale_date
+    
+    Rows without a sale_date belong to no partition; they are read by every run so
+    data-quality checks reject them alike in full and partial runs.
+    """
+    import pandas as pd
+    print("Extracting data from PostgreSQL...")
+    query = ("SELECT sale_id, product_id, quantity, sale_amount, sale_date FROM online_sales "
+             "WHERE sale_date = ANY(%(dates)s::date[]) OR sale_date IS NULL")
+    with postgres_source().connection() as conn:
+        df = pd.read_sql(query, conn, params={'dates': sorted(dates)})
+    
+    print(f"Extracted {len(df)} rows from PostgreSQL for {len(dates)} dates")
+    return df
+
+def extract_postgres_snapshot(bootstrap_cdc=False, stored=None, extra_dates=(), cache_index=None):
+    """Extract online_sales with its partition fingerprints and the change capture position it reflects
+    
+    Given the fingerprints stored with the last load, only the sale dates whose
+    fingerprint changed (plus extra_dates) are selected and returned as dates;
+    otherwise every date is selected and dates is None. Rows are read only for
+    selected dates without a matching partial in cache_index.
+    """
+    import pandas as pd
+    import psycopg2
+    print("Extracting data from PostgreSQL...")
+    query = "SELECT sale_id, product_id, quantity, sale_amount, sale_date FROM online_sales"
+    
+    with postgres_source().connection() as conn:
+        cursor = conn.cursor()
+        mode = cdc_mode(cursor)
+        
+        if mode is None and bootstrap_cdc:
+            cursor.execute("SHOW wal_level")
+            if cursor.fetchone()[0] == 'logical':
+                # Updates and deletes must carry the full old row for signed deltas
+                cursor.execute("ALTER TABLE online_sales REPLICA IDENTITY FULL")
+                conn.commit()
+                try:
+                    df, fingerprints, position = bootstrap_cdc_slot(query)
+                    print(f"Extracted {len(df)} rows from PostgreSQL")
+                    return df, position, fingerprints, None
+                except psycopg2.OperationalError as e:
+                    print(f"Logical replication unavailable ({e}), falling back to a change table")
+                    conn.rollback()
+            
+            # Capture changes with a trigger instead
+            cursor.execute(CDC_TRIGGER_SQL)
+            mode = 'table'
+        conn.commit()
+        
+        # Read the capture position and fingerprints first so they come from the same snapshot as the rows.
+        # The isolation level is set per transaction so it doesn't stick to the pooled connection.
+        cursor.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ")
+        position = None
+        if mode == 'slot':
+            # The WAL position is read after the snapshot is taken, so changes up to it may be
+            # missing from the snapshot: the snapshot itself is recorded, and the next incremental
+            # run skips only the changes of transactions it shows as committed
+            cursor.execute("SELECT pg_current_wal_lsn(), txid_current_snapshot()::text")
+            lsn, snapshot = cursor.fetchone()
+            position = ('slot', lsn, snapshot)
+        elif mode == 'table':
+            cursor.execute(f"SELECT change_id FROM {CDC_CHANGE_TABLE}")
+            position = ('table', [row[0] for row in cursor.fetchall()])
+        fingerprints = fingerprint_postgres(cursor)
+        
+        if stored is None:
+            dates = None
+            selected = set(fingerprints)
+        else:
+            dates = changed_partitions(fingerprints, stored) | set(extra_dates)
+            selected = dates
+        read = uncached_partitions(fingerprints, cache_index or {}, 'online', selected)
+        if dates is None and read == selected:
+            df = pd.read_sql(query, conn)
+        else:
+            df = pd.read_sql(query + " WHERE sale_date = ANY(%(dates)s::date[]) OR sale_date IS NULL",
+                             conn, params={'dates': sorted(read)})
+    
+    print(f"Extracted {len(df)} rows from PostgreSQL"
+          + ("" if dates is None else f" for {len(dates)} changed dates")
+          + (f", {len(selected) - len(read)} dates served from the aggregate cache" if read != selected else ""))
+    return df, position, fingerprints, dates
+
+def cdc_marker(position):
+    """Return the CDC_MARKER value recording the capture position a full load covers
+    
+    'table' or 'slot' when the load reflects exactly the changes before the position,
+    'slot <lsn> <txid snapshot>' when changes up to the lsn must be checked against the
+    load's snapshot.
+    """
+    if position[0] == 'slot' and len(position) > 2:
+        return f"slot {position[1]} {position[2]}"
+    return position[0]
+
+def snapshot_filter(marker):
+    """Return the (lsn, txid snapshot) a CDC_MARKER value records, or None"""
+    parts = marker.split(' ') if marker else []
+    return (parts[1], parts[2]) if len(parts) == 3 else None
+
+def lsn_value(lsn):
+    """Return a pg_lsn text value such as '16/B374D848' as an integer"""
+    high, low = lsn.split('/')
+    return (int(high, 16) << 32) | int(low, 16)
+
+def xid_visible(xid, snapshot):
+    """Return whether transaction xid (a 32-bit xid) had committed for a txid_current_snapshot() value"""
+    xmin, xmax, xip = snapshot.split(':')
+    xmin, xmax = int(xmin), int(xmax)
+    # Widen the xid to a 64-bit txid next to xmax, the newest id the snapshot knows of
+    diff = (int(xid) - xmax) % (1 << 32)
+    txid = xmax + diff if diff < (1 << 31) else xmax - ((1 << 32) - diff)
+    return txid < xmin or (txid < xmax and str(txid) not in xip.split(','))
+
+def parse_cdc_tuple(text):
+    """Parse the 'column[type]:value' pairs of one test_decoding tuple into a dict"""
+    row = {}
+    for name, value in CDC_TUPLE_PATTERN.findall(text):
+        if value == 'null':
+            row[name] = None
+        elif value.startswith("'"):
+            row[name] = value[1:-1].replace("''", "'")
+        else:
+            row[name] = value
+    return row
+
+def parse_cdc_change(data):
+    """Turn one test_decoding line into (sign, row) pairs for online_sales"""
+    prefix = 'table public.online_sales: '
+    if not data.startswith(prefix):
+        return []
+    action, _, body = data[len(prefix):].partition(': ')
+    if action == 'INSERT':
+        return [(1, parse_cdc_tuple(body))]
+    if action == 'DELETE':
+        return [(-1, parse_cdc_tuple(body))]
+    if action == 'UPDATE':
+        old, _, new = body.partition('new-tuple: ')
+        if not old.startswith('old-key: '):
+            raise ValueError("UPDATE without the old row; online_sales needs REPLICA IDENTITY FULL")
+        return [(-1, parse_cdc_tuple(old[len('old-key: '):])), (1, parse_cdc_tuple(new))]
+    return []
+
+@retry_transient
+def extract_postgres_changes(skip=None):
+    """Extract signed row changes on online_sales since the last acknowledged position
+    
+    skip is the (lsn, txid snapshot) of the last full load's snapshot, see snapshot_filter:
+    changes up to lsn whose transaction that snapshot already contains are left out.
+    """
+    import pandas as pd
+    print("Extracting changes from PostgreSQL...")
+    chunk_size = get_config().cdc_chunk_size
+    
+    with postgres_source().connection() as conn:
+        cursor = conn.cursor()
+        mode = cdc_mode(cursor)
+        if mode is None:
+            return None, None
+        
+        # Peek rather than consume: the position is only acknowledged after the load commits
+        rows = []
+        position = None
+        if mode == 'slot':
+            cursor.execute("SELECT lsn::text, xid::text, data FROM pg_logical_slot_peek_changes(%s, NULL, %s)",
+                           (CDC_SLOT_NAME, chunk_size))
+            for lsn, xid, data in cursor.fetchall():
+                position = ('slot', lsn)
+                if skip and lsn_value(lsn) <= lsn_value(skip[0]) and xid_visible(xid, skip[1]):
+                    continue
+                for sign, row in parse_cdc_change(data):
+                    rows.append((row.get('sale_id'), row.get('product_id'), row.get('quantity'),
+                                 row.get('sale_amount'), row.get('sale_date'), sign))
+        else:
+            cursor.execute(f"""
+            SELECT change_id, sale_id, product_id, quantity, sale_amount, sale_date, sign
+            FROM {CDC_CHANGE_TABLE}
+            ORDER BY change_id
+            LIMIT %s
+            """, (chunk_size,))
+            records = cursor.fetchall()
+            if records:
+                position = ('table', [record[0] for record in records])
+            rows = [record[1:] for record in records]
+    
+    df = pd.DataFrame(rows, columns=CDC_COLUMNS)
+    print(f"Extracted {len(df)} signed changes from PostgreSQL ({mode})")
+    return df, position
+
+@retry_transient
+def acknowledge_postgres_changes(position):
+    """Mark the changes up to position as applied so they are not extracted again"""
+    if position is None:
+        return
+    
+    if position[0] == 'slot' and len(position) > 2:
+        # A full load's snapshot: the changes it contains are skipped by transaction on the next
+        # incremental run, as the slot can't skip them without also dropping the ones it lacks
+        return
+    
+    with postgres_source().connection() as conn:
+        cursor = conn.cursor()
+        kind, value = position
+        if kind == 'slot':
+            # Never move the slot backwards if a later run already advanced it
+            cursor.execute("""
+            SELECT pg_replication_slot_advance(slot_name, %s)
+            FROM pg_replication_slots
+            WHERE slot_name = %s AND confirmed_flush_lsn < %s
+            """, (value, CDC_SLOT_NAME, value))
+        elif value:
+            cursor.execute(f"DELETE FROM {CDC_CHANGE_TABLE} WHERE change_id = ANY(%s)", (value,))
+        conn.commit()
@@ -0,0 +1,214 @@
+"""
+ETL run queue: API replicas enqueue runs in the etl_jobs warehouse table and a separate
+worker process claims and executes them, so request-serving containers never run the pipeline.
+A run failing on a transient database error is requeued and resumes from its checkpoints.
+"""
+
+import json
+import time
+import socket
+import traceback
+from datetime import datetime
+
+from retail_etl.checkpoint import clear_checkpoints
+from retail_etl.config import get_config
+from retail_etl.connectors import mysql_sink
+from retail_etl.retry import is_transient, backoff_delay, retry_transient
+from retail_etl.pipeline import run_etl_pipeline, run_incremental_pipeline
+from retail_etl.migrations import migrate
+
+# Job lifecycle: queued -> running -> succeeded | failed
+JOB_QUEUED = 'queued'
+JOB_RUNNING = 'running'
+JOB_SUCCEEDED = 'succeeded'
+JOB_FAILED = 'failed'
+
+# Run modes a job can request
+JOB_MODE_FULL = 'full'                # run_etl_pipeline, optionally over a date range
+JOB_MODE_INCREMENTAL = 'incremental'  # run_incremental_pipeline
+
+# Poll loop iterations between sweeps for jobs left running by a dead worker
+STALE_CHECK_POLLS = 30
+
+JOB_COLUMNS = ['job_id', 'mode', 'start_date', 'end_date', 'force_rebuild', 'status', 'worker',
+               'result', 'error', 'created_at', 'started_at', 'finished_at', 'attempts', 'run_after']
+
+def job_from_row(row):
+    """Return an etl_jobs row as a dict with its result decoded"""
+    job = dict(zip(JOB_COLUMNS, row))
+    job['force_rebuild'] = bool(job['force_rebuild'])
+    job['result'] = json.loads(job['result']) if job['result'] else None
+    return job
+
+def enqueue_job(mode=JOB_MODE_FULL, start_date=None, end_date=None, force=False):
+    """Queue an ETL run and return its job_id; an identical run still waiting in the queue is reused"""
+    with mysql_sink().connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT job_id FROM etl_jobs
+            WHERE status = %s AND mode = %s AND start_date <=> %s AND end_date <=> %s AND force_rebuild = %s
+            ORDER BY job_id LIMIT 1
+        """, (JOB_QUEUED, mode, start_date, end_date, force))
+        row = cursor.fetchone()
+        if row:
+            job_id = row[0]
+        else:
+            cursor.execute(
+                "INSERT INTO etl_jobs (mode, start_date, end_date, force_rebuild, status) VALUES (%s, %s, %s, %s, %s)",
+                (mode, start_date, end_date, force, JOB_QUEUED))
+            job_id = cursor.lastrowid
+        conn.commit()
+        cursor.close()
+    return job_id
+
+def get_job(job_id):
+    """Return the job with this id, or None"""
+    with mysql_sink().connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(f"SELECT {', '.join(JOB_COLUMNS)} FROM etl_jobs WHERE job_id = %s", (job_id,))
+        row = cursor.fetchone()
+        cursor.close()
+    return job_from_row(row) if row else None
+
+def job_run_id(job):
+    """Return the run id a job's checkpoints and staged loads are kept under"""
+    return f"job-{job['job_id']}"
+
+@retry_transient
+def claim_job(worker):
+    """Mark the oldest unfinished job as running for this worker and return it
+    
+    Jobs run strictly in queue order: None is returned while the oldest one is
+    running, or requeued and not yet due. A requeued job resumes from checkpoints
+    taken against the warehouse as it was, so no newer job may run before it.
+    """
+    with mysql_sink().connection() as conn:
+        cursor = conn.cursor()
+        # Locking the head of the queue makes concurrent pollers wait for each other's claim
+        cursor.execute(f"""
+            SELECT {', '.join(JOB_COLUMNS)}, run_after IS NULL OR run_after <= NOW() FROM etl_jobs
+            WHERE status IN (%s, %s)
+            ORDER BY job_id LIMIT 1
+            FOR UPDATE
+        """, (JOB_QUEUED, JOB_RUNNING))
+        row = cursor.fetchone()
+        if row and (row[JOB_COLUMNS.index('status')] != JOB_QUEUED or not row[-1]):
+            row = None
+        if row:
+            row = row[:-1]
+            cursor.execute("""
+                UPDATE etl_jobs SET status = %s, worker = %s, started_at = NOW(), attempts = attempts + 1
+                WHERE job_id = %s
+            """, (JOB_RUNNING, worker, row[0]))
+        conn.commit()
+        cursor.close()
+    if not row:
+        return None
+    job = job_from_row(row)
+    job.update(status=JOB_RUNNING, worker=worker, attempts=job['attempts'] + 1)
+    return job
+
+@retry_transient
+def requeue_job(job_id, error, delay):
+    """Put a job that failed on a transient error back in the queue, due after delay seconds"""
+    with mysql_sink().connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("""
+            UPDATE etl_jobs SET status = %s, worker = NULL, error = %s, run_after = NOW() + INTERVAL %s SECOND
+            WHERE job_id = %s
+        """, (JOB_QUEUED, error, int(delay), job_id))
+        conn.commit()
+        cursor.close()
+
+@retry_transient
+def finish_job(job_id, status, result=None, error=None):
+    """Record the outcome of a job"""
+    with mysql_sink().connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("UPDATE etl_jobs SET status = %s, result = %s, error = %s, finished_at = NOW() WHERE job_id = %s",
+                       (status, json.dumps(result) if result is not None else None, error, job_id))
+        conn.commit()
+        cursor.close()
+
+@retry_transient
+def fail_stale_jobs(worker=None):
+    """Requeue (or fail, once out of attempts) running jobs whose worker died mid-run
+    
+    Those are the jobs running for longer than job_timeout or, given a worker that is
+    just starting, every job still marked as running by that worker.
+    """
+    config = get_config()
+    if worker is None:
+        stale_filter, params = "started_at < NOW() - INTERVAL %s SECOND", (config.job_timeout,)
+    else:
+        stale_filter, params = "worker = %s", (worker,)
+    with mysql_sink().connection() as conn:
+        cursor = conn.cursor()
+        # A requeued job resumes from the checkpoints its previous attempt left
+        cursor.execute(f"""
+            UPDATE etl_jobs SET status = %s, worker = NULL, error = %s
+            WHERE status = %s AND {stale_filter} AND attempts < %s
+        """, (JOB_QUEUED, 'Worker stopped before the run finished', JOB_RUNNING) + params + (config.job_max_attempts,))
+        requeued = cursor.rowcount
+        cursor.execute(f"""
+            UPDATE etl_jobs SET status = %s, error = %s, finished_at = NOW()
+            WHERE status = %s AND {stale_filter}
+        """, (JOB_FAILED, 'Worker stopped before the run finished', JOB_RUNNING) + params)
+        stale = cursor.rowcount
+        conn.commit()
+        cursor.close()
+    if requeued:
+        print(f"Requeued {requeued} stale running jobs")
+    if stale:
+        print(f"Marked {stale} stale running jobs as failed")
+
+def run_job(job, csv_path):
+    """Execute one claimed job and return its result"""
+    if job['mode'] == JOB_MODE_INCREMENTAL:
+        result = run_incremental_pipeline(csv_path, run_id=job_run_id(job))
+    else:
+        start_date = job['start_date'].isoformat() if job['start_date'] else None
+        end_date = job['end_date'].isoformat() if job['end_date'] else None
+        result = run_etl_pipeline(csv_path, start_date, force=job['force_rebuild'], end_date=end_date,
+                                  run_id=job_run_id(job))
+    return result
+
+def run_worker(csv_path, poll_interval=None, once=False):
+    """Claim and execute queued jobs one at a time until stopped (or the queue is empty, with once)"""
+    worker = socket.gethostname()
+    poll_interval = get_config().worker_poll_interval if poll_interval is None else poll_interval
+    print(f"ETL worker {worker} polling etl_jobs every {poll_interval}s, press Ctrl+C to stop")
+    migrate()
+    # A container restarted after a crash keeps its hostname, so its interrupted job is found at once
+    fail_stale_jobs(worker)
+    fail_stale_jobs()
+    polls = 0
+    while True:
+        # Jobs of workers that died without coming back are picked up while polling
+        polls += 1
+        if polls % STALE_CHECK_POLLS == 0:
+            fail_stale_jobs()
+        
+        job = claim_job(worker)
+        if job is None:
+            if once:
+                return
+            time.sleep(poll_interval)
+            continue
+        
+        print(f"Running job {job['job_id']} ({job['mode']}, attempt {job['attempts']}) at {datetime.now()}")
+        try:
+            result = run_job(job, csv_path)
+        except Exception as e:
+            traceback.print_exc()
+            if is_transient(e) and job['attempts'] < get_config().job_max_attempts:
+                # The database is still unreachable after the per-operation retries; try the run again
+                # later, continuing their backoff sequence
+                delay = backoff_delay(get_config().retry_attempts + job['attempts'])
+                print(f"Requeued job {job['job_id']} to resume in {delay:.0f}s")
+                requeue_job(job['job_id'], str(e), delay)
+            else:
+                clear_checkpoints(job_run_id(job))
+                finish_job(job['job_id'], JOB_FAILED, error=str(e))
+        else:
+            finish_job(job['job_id'], JOB_SUCCEEDED, result)
@@ -0,0 +1,446 @@
+"""
+Load: daily facts, weekly/monthly rollups and all-time totals in the MySQL warehouse,
+plus the source fingerprints stored alongside each load. Large loads are staged in
+committed batches, so a retried load resumes where the failed attempt stopped.
+"""
+
+import uuid
+import hashlib
+from datetime import datetime, timedelta
+
+from retail_etl.config import get_config
+from retail_etl.connectors import mysql_sink
+from retail_etl.retry import retry_transient
+
+# Rollup tables maintained from daily_sales: (table, period key column, grain)
+ROLLUP_TABLES = [
+    ('weekly_sales', 'week_start', 'week'),
+    ('monthly_sales', 'month_start', 'month'),
+]
+
+# Load modes for load_to_mysql
+LOAD_MODE_REPLACE = 'replace'  # replace the dates in the run in place, in one transaction
+LOAD_MODE_SWAP = 'swap'        # rebuild every warehouse table in staging and swap it in
+LOAD_MODE_DELTA = 'delta'      # add signed CDC deltas onto the existing daily facts
+
+# Columns of the daily fact rows load_to_mysql builds
+DAILY_COLUMNS = ['sale_date', 'product_id', 'total_quantity', 'total_sale_amount']
+
+# Primary keys of the warehouse tables, built once at the end of a swap load
+WAREHOUSE_KEYS = {
+    'daily_sales': 'sale_date, product_id',
+    'weekly_sales': 'week_start, product_id',
+    'monthly_sales': 'month_start, product_id',
+    'aggregated_sales': 'product_id',
+}
+
+# Secondary indexes built with the primary keys of a swap load (and added to existing
+# warehouses by retail_etl.migrations); they cover the ranked aggregated_sales queries
+WAREHOUSE_INDEXES = {
+    'aggregated_sales': [
+        ('idx_aggregated_sales_revenue', 'total_sale_amount DESC, total_quantity'),
+        ('idx_aggregated_sales_quantity', 'total_quantity DESC, total_sale_amount'),
+    ],
+}
+
+# etl_fingerprints row saved with each full load taken while change capture is active,
+# holding the capture mode; incremental runs wait for it before applying changes
+CDC_MARKER = ('cdc', '*')
+
+# etl_fingerprints row saved with each full load, holding the digest of the data-quality
+# settings it was validated with; a run finding another digest rebuilds every date
+DQ_MARKER = ('dq', '*')
+
+# Seconds the swap's RENAME waits for the metadata locks of running reads. A pending RENAME
+# queues every later read of the table behind it, so it gives up early and the swap is
+# retried with backoff (lock wait timeouts are transient) instead of stalling readers
+SWAP_LOCK_WAIT_TIMEOUT = 5
+
+# MySQL error: the table already has a primary key (an earlier attempt indexed the staging copy)
+ER_MULTIPLE_PRI_KEY = 1068
+
+def period_start(day, grain):
+    """Return the first day of the week (Monday) or month containing day"""
+    if grain == 'week':
+        return day - timedelta(days=day.weekday())
+    return day.replace(day=1)
+
+def period_end(start, grain):
+    """Return the first day after the period beginning at start"""
+    if grain == 'week':
+        return start + timedelta(days=7)
+    return (start + timedelta(days=32)).replace(day=1)
+
+def refresh_rollups(cursor, dates):
+    """Rebuild the weekly/monthly rollup rows for the periods touching dates"""
+    for table, key, grain in ROLLUP_TABLES:
+        starts = sorted({period_start(day, grain) for day in dates})
+        for start in starts:
+            cursor.execute(f"DELETE FROM {table} WHERE {key} = %s", (start,))
+            cursor.execute(f"""
+            INSERT INTO {table} ({key}, product_id, total_quantity, total_sale_amount)
+            SELECT %s, product_id, SUM(total_quantity), SUM(total_sale_amount)
+            FROM daily_sales
+            WHERE sale_date >= %s AND sale_date < %s
+            GROUP BY product_id
+            """, (start, start, period_end(start, grain)))
+        print(f"Refreshed {len(starts)} periods in {table}")
+
+def refresh_product_totals(cursor, product_ids):
+    """Recompute the all-time totals in aggregated_sales from the monthly rollup"""
+    if not product_ids:
+        return
+    placeholders = ', '.join(['%s'] * len(product_ids))
+    cursor.execute(f"DELETE FROM aggregated_sales WHERE product_id IN ({placeholders})", product_ids)
+    cursor.execute(f"""
+    INSERT INTO aggregated_sales (product_id, total_quantity, total_sale_amount)
+    SELECT product_id, SUM(total_quantity), SUM(total_sale_amount)
+    FROM monthly_sales
+    WHERE product_id IN ({placeholders})
+    GROUP BY product_id
+    """, product_ids)
+
+def insert_batches(cursor, table, columns, rows, suffix=''):
+    """Insert rows in multi-row INSERT statements of load_batch_size rows"""
+    batch_size = get_config().load_batch_size
+    query = f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join(['%s'] * len(columns))}) {suffix}"
+    for i in range(0, len(rows), batch_size):
+        cursor.executemany(query, rows[i:i + batch_size])
+
+def build_rollup_rows(data, grain):
+    """Sum daily (sale_date, product_id, quantity, amount) rows into period rows"""
+    starts = {day: period_start(day, grain) for day in {row[0] for row in data}}
+    totals = {}
+    for day, product_id, quantity, amount in data:
+        key = (starts[day], product_id)
+        current = totals.get(key, (0, 0.0))
+        totals[key] = (current[0] + quantity, current[1] + amount)
+    return [(start, product_id, quantity, round(amount, 2)) for (start, product_id), (quantity, amount) in totals.items()]
+
+def swap_table_rows(data):
+    """Return {table: (columns, rows)} rebuilding every warehouse table from the daily rows"""
+    product_totals = {}
+    for _, product_id, quantity, amount in data:
+        current = product_totals.get(product_id, (0, 0.0))
+        product_totals[product_id] = (current[0] + quantity, current[1] + amount)
+    
+    table_rows = {
+        'daily_sales': (DAILY_COLUMNS, data),
+        'aggregated_sales': (['product_id', 'total_quantity', 'total_sale_amount'],
+                             [(pid, q, round(a, 2)) for pid, (q, a) in product_totals.items()]),
+    }
+    for table, key, grain in ROLLUP_TABLES:
+        table_rows[table] = ([key, 'product_id', 'total_quantity', 'total_sale_amount'], build_rollup_rows(data, grain))
+    return table_rows
+
+def load_id_for(df_daily, mode, run_id=None):
+    """Return the id of a load, the same for the same run, mode and rows so that a retry resumes it"""
+    import pandas as pd
+    if run_id is None:
+        return uuid.uuid4().hex[:12]
+    digest = hashlib.sha1(f"{run_id}:{mode}".encode())
+    digest.update(pd.util.hash_pandas_object(df_daily, index=False).values.tobytes())
+    return digest.hexdigest()[:12]
+
+# Loads larger than one batch are staged in per-load copies of the warehouse tables, each
+# batch committed together with the load's progress row in etl_load_progress, so a retried
+# load resumes after its last committed batch. Applying the staged rows records the load as
+# applied in the same transaction, so a retry after that point doesn't apply it again
+def staging_table(table, load_id):
+    """Return the name of table's staging copy for a load"""
+    return f"{table}_stage_{load_id}"
+
+@retry_transient
+def begin_staging(load_id, table):
+    """Create table's staging copy unless an earlier attempt of the load did, and return the rows it holds"""
+    with mysql_sink().connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT rows_staged FROM etl_load_progress WHERE load_id = %s AND table_name = %s",
+                       (load_id, table))
+        row = cursor.fetchone()
+        if row is None:
+            # Staging copies share the column definitions but carry no indexes while loading
+            cursor.execute(f"DROP TABLE IF EXISTS {staging_table(table, load_id)}")
+            cursor.execute(f"CREATE TABLE {staging_table(table, load_id)} SELECT * FROM {table} WHERE 1 = 0")
+            cursor.execute("INSERT INTO etl_load_progress (load_id, table_name) VALUES (%s, %s)", (load_id, table))
+            conn.commit()
+        cursor.close()
+    return row[0] if row else 0
+
+@retry_transient
+def stage_batch(load_id, table, columns, rows):
+    """Stage the batch of rows after those already committed, with its progress, and return the rows staged"""
+    with mysql_sink().connection() as conn:
+        cursor = conn.cursor()
+        # The progress row lock serializes concurrent attempts of the same load
+        cursor.execute("SELECT rows_staged FROM etl_load_progress WHERE load_id = %s AND table_name = %s FOR UPDATE",
+                       (load_id, table))
+        staged = cursor.fetchone()[0]
+        batch = rows[staged:staged + get_config().load_batch_size]
+        insert_batches(cursor, staging_table(table, load_id), columns, batch)
+        cursor.execute("UPDATE etl_load_progress SET rows_staged = %s WHERE load_id = %s AND table_name = %s",
+                       (staged + len(batch), load_id, table))
+        conn.commit()
+        cursor.close()
+    return staged + len(batch)
+
+def stage_rows(load_id, table, columns, rows):
+    """Stage rows for table in committed batches, resuming after the last batch an earlier attempt committed"""
+    staged = begin_staging(load_id, table)
+    if 0 < staged < len(rows):
+        print(f"Resuming {table} staging after {staged} of {len(rows)} rows")
+    while staged < len(rows):
+        staged = stage_batch(load_id, table, columns, rows)
+    print(f"Staged {len(rows)} rows for {table}")
+
+def load_applied(cursor, load_id):
+    """Return whether an earlier attempt already applied the load, locking its progress rows"""
+    cursor.execute("SELECT applied FROM etl_load_progress WHERE load_id = %s FOR UPDATE", (load_id,))
+    return any(applied for (applied,) in cursor.fetchall())
+
+def mark_applied(cursor, load_id):
+    """Record in the applying transaction that the load is applied"""
+    cursor.execute("""
+    INSERT INTO etl_load_progress (load_id, table_name, applied) VALUES (%s, 'daily_sales', TRUE)
+    ON DUPLICATE KEY UPDATE applied = TRUE
+    """, (load_id,))
+
+@retry_transient
+def apply_daily_load(load_id, mode, data, dates, staged):
+    """Apply the daily facts, from the staging copy or straight from data, and refresh the
+    rollups and all-time totals, all in one transaction
+    
+    Returns False if an earlier attempt already applied the load.
+    """
+    with mysql_sink().connection() as conn:
+        cursor = conn.cursor()
+        if load_applied(cursor, load_id):
+            cursor.close()
+            return False
+        
+        placeholders = ', '.join(['%s'] * len(dates))
+        if mode == LOAD_MODE_DELTA:
+            # Add the signed deltas onto the existing facts and drop days that net to nothing
+            if staged:
+                cursor.execute(f"""
+                INSERT INTO daily_sales ({', '.join(DAILY_COLUMNS)})
+                SELECT * FROM (
+                    SELECT sale_date, product_id, total_quantity AS delta_quantity, total_sale_amount AS delta_amount
+                    FROM {staging_table('daily_sales', load_id)}
+                ) AS delta
+                ON DUPLICATE KEY UPDATE total_quantity = total_quantity + delta_quantity,
+                                        total_sale_amount = total_sale_amount + delta_amount
+                """)
+            else:
+                insert_batches(cursor, 'daily_sales', DAILY_COLUMNS, data,
+                               "ON DUPLICATE KEY UPDATE total_quantity = total_quantity + VALUES(total_quantity), "
+                               "total_sale_amount = total_sale_amount + VALUES(total_sale_amount)")
+            cursor.execute(f"""
+            DELETE FROM daily_sales
+            WHERE sale_date IN ({placeholders}) AND total_quantity = 0 AND total_sale_amount = 0
+            """, dates)
+            
+            # These dates no longer match their source fingerprints; the next full run rechecks them
+            cursor.execute(f"DELETE FROM etl_fingerprints WHERE partition_key IN ({placeholders})",
+                           [day.isoformat() for day in dates])
+            product_ids = {row[1] for row in data}
+        else:
+            # Products that had sales on the reloaded dates need their totals recomputed too
+            cursor.execute(f"SELECT DISTINCT product_id FROM daily_sales WHERE sale_date IN ({placeholders})", dates)
+            product_ids = {row[0] for row in cursor.fetchall()}
+            product_ids.update(row[1] for row in data)
+            
+            # Replace the daily facts for the dates covered by this run
+            cursor.execute(f"DELETE FROM daily_sales WHERE sale_date IN ({placeholders})", dates)
+            if staged:
+                cursor.execute(f"""
+                INSERT INTO daily_sales ({', '.join(DAILY_COLUMNS)})
+                SELECT {', '.join(DAILY_COLUMNS)} FROM {staging_table('daily_sales', load_id)}
+                """)
+            else:
+                insert_batches(cursor, 'daily_sales', DAILY_COLUMNS, data)
+        
+        # Refresh the rollups and the all-time totals in the same transaction
+        refresh_rollups(cursor, dates)
+        refresh_product_totals(cursor, sorted(product_ids))
+        mark_applied(cursor, load_id)
+        conn.commit()
+        cursor.close()
+    return True
+
+@retry_transient
+def swap_staged_tables(load_id, tables):
+    """Index the staged copies and swap them in for the live tables atomically
+    
+    Returns False if an earlier attempt already applied the load.
+    """
+    import mysql.connector
+    with mysql_sink().connection() as conn:
+        cursor = conn.cursor()
+        # Concurrent swap loads would otherwise interleave their renames
+        cursor.execute("SELECT GET_LOCK('retail_dw_swap_load', 300)")
+        if cursor.fetchone()[0] != 1:
+            raise RuntimeError("Timed out waiting for another swap load to finish")
+        if load_applied(cursor, load_id):
+            cursor.execute("SELECT RELEASE_LOCK('retail_dw_swap_load')")
+            cursor.fetchone()
+            cursor.close()
+            return False
+        
+        staged = [staging_table(table, load_id) for table in tables]
+        cursor.execute(f"""
+        SELECT COUNT(*) FROM information_schema.tables
+        WHERE table_schema = DATABASE() AND table_name IN ({', '.join(['%s'] * len(staged))})
+        """, staged)
+        # No staging copies left means an earlier attempt's RENAME went through before it could record it
+        if cursor.fetchone()[0]:
+            # Build each index once over the full table instead of maintaining it per row,
+            # all of a table's indexes in a single ALTER
+            for table in tables:
+                indexes = ''.join(f", ADD INDEX {name} ({columns})" for name, columns in WAREHOUSE_INDEXES.get(table, []))
+                try:
+                    cursor.execute(f"ALTER TABLE {staging_table(table, load_id)} ADD PRIMARY KEY ({WAREHOUSE_KEYS[table]}){indexes}")
+                except mysql.connector.Error as e:
+                    if e.errno != ER_MULTIPLE_PRI_KEY:
+                        raise
+            
+            # A multi-table RENAME is atomic: readers see either the old or the new tables
+            cursor.execute("SET SESSION lock_wait_timeout = %s", (SWAP_LOCK_WAIT_TIMEOUT,))
+            renames = []
+            for table in tables:
+                cursor.execute(f"DROP TABLE IF EXISTS {table}_old")
+                renames.append(f"{table} TO {table}_old, {staging_table(table, load_id)} TO {table}")
+            cursor.execute(f"RENAME TABLE {', '.join(renames)}")
+        mark_applied(cursor, load_id)
+        conn.commit()
+        for table in tables:
+            cursor.execute(f"DROP TABLE IF EXISTS {table}_old")
+        cursor.execute("SELECT RELEASE_LOCK('retail_dw_swap_load')")
+        cursor.fetchone()
+        cursor.close()
+    return True
+
+@retry_transient
+def drop_staging(load_id, tables):
+    """Drop a load's staging copies once it is applied"""
+    with mysql_sink().connection() as conn:
+        cursor = conn.cursor()
+        for table in tables:
+            cursor.execute(f"DROP TABLE IF EXISTS {staging_table(table, load_id)}")
+        cursor.close()
+
+@retry_transient
+def purge_stale_loads():
+    """Drop the staging copies and progress of loads untouched for longer than checkpoint_max_age"""
+    with mysql_sink().connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("""
+        SELECT load_id FROM etl_load_progress
+        GROUP BY load_id
+        HAVING MAX(updated_at) < NOW() - INTERVAL %s SECOND
+        """, (get_config().checkpoint_max_age,))
+        stale = [load_id for (load_id,) in cursor.fetchall()]
+        for load_id in stale:
+            for table in WAREHOUSE_KEYS:
+                cursor.execute(f"DROP TABLE IF EXISTS {staging_table(table, load_id)}")
+            cursor.execute("DELETE FROM etl_load_progress WHERE load_id = %s", (load_id,))
+            conn.commit()
+        cursor.close()
+    if stale:
+        print(f"Purged {len(stale)} abandoned loads")
+
+def load_to_mysql(df_daily, mode=LOAD_MODE_REPLACE, dates=None, run_id=None):
+    """Load daily facts to MySQL and refresh the rollups and all-time totals
+    
+    In replace mode, dates (YYYY-MM-DD strings) lists extra sale dates to clear
+    even if the frame has no rows left for them. Loads larger than one batch are
+    staged in committed batches before being applied in one short transaction;
+    calling again with the same run_id and rows resumes after the last committed
+    batch, and a load that was already applied is not applied twice.
+    """
+    import pandas as pd
+    print(f"Loading data to MySQL ({mode} mode)...")
+    
+    # Prepare the data for insertion
+    sale_dates = pd.to_datetime(df_daily['sale_date']).dt.date.tolist()
+    data = list(zip(
+        sale_dates,
+        df_daily['product_id'].astype(int).tolist(),
+        df_daily['total_quantity'].astype(int).tolist(),
+        df_daily['total_sale_amount'].astype(float).tolist()
+    ))
+    dates = sorted(set(sale_dates) | {datetime.strptime(day, '%Y-%m-%d').date() for day in dates or ()})
+    if not dates:
+        print("No rows to load")
+        return
+    load_id = load_id_for(df_daily, mode, run_id)
+    purge_stale_loads()
+    
+    if mode == LOAD_MODE_SWAP:
+        # Rebuild every warehouse table in staging and swap them in
+        table_rows = swap_table_rows(data)
+        for table, (columns, rows) in table_rows.items():
+            stage_rows(load_id, table, columns, rows)
+        applied = swap_staged_tables(load_id, list(table_rows))
+    else:
+        # A load that fits in one batch has nothing to resume and is applied directly
+        staged = len(data) > get_config().load_batch_size
+        if staged:
+            stage_rows(load_id, 'daily_sales', DAILY_COLUMNS, data)
+        applied = apply_daily_load(load_id, mode, data, dates, staged)
+        if staged:
+            drop_staging(load_id, ['daily_sales'])
+    
+    if applied:
+        print(f"Loaded {len(data)} daily rows for {len(dates)} dates into MySQL")
+    else:
+        print(f"Load {load_id} was already applied by an earlier attempt")
+
+@retry_transient
+def has_daily_facts():
+    """Return whether daily_sales holds any rows (it is empty on warehouses predating it)"""
+    with mysql_sink().connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT 1 FROM daily_sales LIMIT 1")
+        found = cursor.fetchone() is not None
+        cursor.close()
+    return found
+
+@retry_transient
+def load_marker(marker):
+    """Return the value of a marker row (CDC_MARKER, DQ_MARKER) stored with the fingerprints, or None"""
+    with mysql_sink().connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT fingerprint FROM etl_fingerprints WHERE source = %s AND partition_key = %s", marker)
+        row = cursor.fetchone()
+        cursor.close()
+    return row[0] if row else None
+
+def cdc_bootstrapped():
+    """Return whether a full load recorded the change capture position it covers (the CDC_MARKER row)"""
+    return load_marker(CDC_MARKER) is not None
+
+@retry_transient
+def load_fingerprints():
+    """Return the fingerprints stored with the last load as {(source, partition_key): fingerprint}"""
+    with mysql_sink().connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT source, partition_key, fingerprint FROM etl_fingerprints")
+        fingerprints = {(source, key): fingerprint for source, key, fingerprint in cursor.fetchall()}
+        cursor.close()
+    return fingerprints
+
+@retry_transient
+def save_fingerprints(fingerprints, scope=None):
+    """Replace the stored fingerprints for the partition keys in scope, or all of them"""
+    with mysql_sink().connection() as conn:
+        cursor = conn.cursor()
+        if scope is None:
+            cursor.execute("DELETE FROM etl_fingerprints")
+        elif scope:
+            placeholders = ', '.join(['%s'] * len(scope))
+            cursor.execute(f"DELETE FROM etl_fingerprints WHERE partition_key IN ({placeholders})", list(scope))
+        rows = [(source, key, fingerprint) for (source, key), fingerprint in fingerprints.items()]
+        insert_batches(cursor, 'etl_fingerprints', ['source', 'partition_key', 'fingerprint'], rows)
+        conn.commit()
+        cursor.close()
@@ -0,0 +1,151 @@
+"""
+Versioned warehouse schema migrations, applied in order and recorded in schema_migrations.
+
+The setup SQL only runs on an empty data directory, so warehouses created before a table
+was introduced get it from here. Each migration is a list of statements written to run online
+(new tables, or ALGORITHM=INPLACE, LOCK=NONE), so loads and API reads continue while it is
+applied. Only the small bookkeeping tables the API never reads may be copied instead.
+Append new migrations; never edit applied ones.
+"""
+
+from retail_etl.connectors import mysql_sink
+
+# (version, description, statements)
+MIGRATIONS = [
+    # Tables added to the setup SQL since the first release, as they were first shipped
+    (1, 'Warehouse tables for daily facts, rollups, fingerprints and the job queue', [
+        """
+        CREATE TABLE IF NOT EXISTS daily_sales (
+            sale_date DATE NOT NULL,
+            product_id INT NOT NULL,
+            total_quantity INT,
+            total_sale_amount DECIMAL(12, 2),
+            PRIMARY KEY (sale_date, product_id)
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS weekly_sales (
+            week_start DATE NOT NULL,
+            product_id INT NOT NULL,
+            total_quantity INT,
+            total_sale_amount DECIMAL(14, 2),
+            PRIMARY KEY (week_start, product_id)
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS monthly_sales (
+            month_start DATE NOT NULL,
+            product_id INT NOT NULL,
+            total_quantity INT,
+            total_sale_amount DECIMAL(14, 2),
+            PRIMARY KEY (month_start, product_id)
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS etl_fingerprints (
+            source VARCHAR(16) NOT NULL,
+            partition_key VARCHAR(10) NOT NULL,
+            fingerprint VARCHAR(64) NOT NULL,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+            PRIMARY KEY (source, partition_key)
+        )
+        """,
+        # attempts and run_after are added by migration 3
+        """
+        CREATE TABLE IF NOT EXISTS etl_jobs (
+            job_id BIGINT AUTO_INCREMENT PRIMARY KEY,
+            mode VARCHAR(16) NOT NULL,
+            start_date DATE NULL,
+            end_date DATE NULL,
+            force_rebuild BOOLEAN NOT NULL DEFAULT FALSE,
+            status VARCHAR(16) NOT NULL,
+            worker VARCHAR(64) NULL,
+            result TEXT NULL,
+            error TEXT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            started_at TIMESTAMP NULL,
+            finished_at TIMESTAMP NULL,
+            KEY idx_etl_jobs_status (status, job_id)
+        )
+        """,
+    ]),
+    (2, 'Covering indexes for ranked aggregated_sales queries', [
+        # With the implicit product_id primary key each index covers all three columns
+        "ALTER TABLE aggregated_sales ADD INDEX idx_aggregated_sales_revenue (total_sale_amount DESC, total_quantity), "
+        "ALGORITHM=INPLACE, LOCK=NONE",
+        "ALTER TABLE aggregated_sales ADD INDEX idx_aggregated_sales_quantity (total_quantity DESC, total_sale_amount), "
+        "ALGORITHM=INPLACE, LOCK=NONE",
+    ]),
+    (3, 'Resumable staged loads and retried ETL jobs', [
+        """
+        CREATE TABLE IF NOT EXISTS etl_load_progress (
+            load_id CHAR(12) NOT NULL,
+            table_name VARCHAR(64) NOT NULL,
+            rows_staged INT NOT NULL DEFAULT 0,
+            applied BOOLEAN NOT NULL DEFAULT FALSE,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+            PRIMARY KEY (load_id, table_name)
+        )
+        """,
+        # One column per statement, so a column added by the setup SQL doesn't skip the other
+        "ALTER TABLE etl_jobs ADD COLUMN attempts INT NOT NULL DEFAULT 0, ALGORITHM=INPLACE, LOCK=NONE",
+        "ALTER TABLE etl_jobs ADD COLUMN run_after TIMESTAMP NULL, ALGORITHM=INPLACE, LOCK=NONE",
+    ]),
+    (4, 'Room for the change capture snapshot in the CDC marker row', [
+        # Changing the type copies the table, which holds one row per source and sale date
+        "ALTER TABLE etl_fingerprints MODIFY fingerprint TEXT NOT NULL",
+    ]),
+]
+
+# MySQL errors meaning the statement's change is already in place
+ALREADY_APPLIED_ERRNOS = {
+    1060,  # ER_DUP_FIELDNAME: column already exists
+    1061,  # ER_DUP_KEYNAME: index already exists (setup SQL or a swap load created it)
+}
+
+def applied_versions(cursor):
+    """Return the set of migration versions recorded in schema_migrations"""
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS schema_migrations (
+        version INT PRIMARY KEY,
+        description VARCHAR(255) NOT NULL,
+        applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """)
+    cursor.execute("SELECT version FROM schema_migrations")
+    return {version for (version,) in cursor.fetchall()}
+
+def migrate():
+    """Apply the pending migrations in version order and return the versions applied"""
+    import mysql.connector
+    applied = []
+    with mysql_sink().connection() as conn:
+        cursor = conn.cursor()
+        # Workers starting together must not run the same DDL twice
+        cursor.execute("SELECT GET_LOCK('retail_dw_migrate', 600)")
+        if cursor.fetchone()[0] != 1:
+            raise RuntimeError("Timed out waiting for another migration run to finish")
+        try:
+            done = applied_versions(cursor)
+            for version, description, statements in MIGRATIONS:
+                if version in done:
+                    continue
+                print(f"Applying migration {version}: {description}")
+                for statement in statements:
+                    try:
+                        cursor.execute(statement)
+                    except mysql.connector.Error as e:
+                        if e.errno not in ALREADY_APPLIED_ERRNOS:
+                            raise
+                        print(f"  already in place: {e.msg}")
+                cursor.execute("INSERT INTO schema_migrations (version, description) VALUES (%s, %s)",
+                               (version, description))
+                conn.commit()
+                applied.append(version)
+        finally:
+            cursor.execute("SELECT RELEASE_LOCK('retail_dw_migrate')")
+            cursor.fetchone()
+            cursor.close()
+    if not applied:
+        print("Warehouse schema is up to date")
+    return applied
@@ -0,0 +1,247 @@
+"""
+End-to-end runs: fingerprint-driven full/ranged reloads, incremental CDC runs and CSV following.
+
+Runs given a run_id checkpoint their transform output (with the fingerprints and source
+positions to record after the load), so a retry of the run skips straight to the load,
+which in turn resumes after its last committed batch.
+"""
+
+import time
+from datetime import datetime
+
+from retail_etl.cache import aggregate_cache_index, uncached_partitions, dq_settings_digest
+from retail_etl.checkpoint import has_checkpoint, save_checkpoint, load_checkpoint, clear_checkpoints, purge_stale_checkpoints
+from retail_etl.extract import (
+    CDC_COLUMNS, extract_csv_tail, fingerprint_csv_file, sale_date_keys, fingerprint_partitions,
+    changed_partitions, save_csv_state, extract_postgres_fingerprints, extract_postgres_partitions,
+    extract_postgres_snapshot, extract_postgres_changes, acknowledge_postgres_changes,
+    cdc_marker, snapshot_filter,
+)
+from retail_etl.transform import transform_data, assemble_daily_facts
+from retail_etl.load import CDC_MARKER, DQ_MARKER, LOAD_MODE_REPLACE, LOAD_MODE_SWAP, LOAD_MODE_DELTA, load_to_mysql, load_fingerprints, save_fingerprints, load_marker, cdc_bootstrapped, has_daily_facts
+
+# Why ranged runs are refused once change capture is initialised
+RANGED_RUN_WITH_CDC = ("Ranged runs are disabled while change capture is active: they don't acknowledge "
+                       "the captured changes, so the next incremental run would apply those again. "
+                       "Run a full or an incremental load instead.")
+
+# Checkpointed stages: the transform output of a full/ranged run and of an incremental run
+STAGE_TRANSFORM = 'transform'
+STAGE_INCREMENTAL_TRANSFORM = 'incremental_transform'
+
+def checkpoint_stage(run_id, stage, plan):
+    """Checkpoint a run's load plan, data-quality counts of its transform included"""
+    purge_stale_checkpoints()
+    save_checkpoint(run_id, stage, plan)
+
+def resume_stage(run_id, stage):
+    """Return the load plan an earlier attempt of the run checkpointed, or None"""
+    plan = load_checkpoint(run_id, stage) if run_id else None
+    if plan is not None:
+        print(f"Resuming run {run_id} from its checkpointed {stage.replace('_', ' ')} output")
+    return plan
+
+def plan_etl_run(csv_path, execution_date=None, bootstrap_cdc=False, force=False, end_date=None):
+    """Extract and transform the sale dates whose source data changed
+    
+    Returns the load plan: the daily facts to load (None if nothing changed) with
+    the fingerprints and source positions to record once they are loaded, and the
+    reject counts of the transform.
+    """
+    import pandas as pd
+    
+    # Fingerprints stored with the previous load; forced and bootstrap runs rebuild everything
+    stored = {} if force or bootstrap_cdc else load_fingerprints()
+    if stored and stored.get(DQ_MARKER) != dq_settings_digest():
+        # Rows accepted or rejected under other data-quality settings must be validated again
+        print("Data-quality settings changed since the last full load, rebuilding every date")
+        stored = {}
+    stored_online = {key: fp for (source, key), fp in stored.items() if source == 'online'}
+    stored_in_store = {key: fp for (source, key), fp in stored.items() if source == 'in_store' and key != '*'}
+    scope = None
+    if execution_date:
+        scope = set(pd.date_range(execution_date, end_date or execution_date).strftime('%Y-%m-%d'))
+    cache_index = {} if force or bootstrap_cdc else aggregate_cache_index()
+    
+    # Extract - the CSV is only parsed when its size or mtime moved since the last load
+    csv_file_fingerprint = fingerprint_csv_file(csv_path)
+    csv_data = None
+    csv_state = None
+    if stored.get(('in_store', '*')) == csv_file_fingerprint:
+        in_store_fingerprints = stored_in_store
+    else:
+        csv_data, csv_state, _ = extract_csv_tail(csv_path, full=True)
+        in_store_fingerprints = fingerprint_partitions(csv_data)
+    csv_dates = changed_partitions(in_store_fingerprints, stored_in_store, scope)
+    
+    # A full extract also records the CDC position its snapshot covers
+    cdc_position = None
+    if scope is not None:
+        online_fingerprints = extract_postgres_fingerprints(scope)
+        dates = csv_dates | changed_partitions(online_fingerprints, stored_online, scope)
+        postgres_data = extract_postgres_partitions(uncached_partitions(online_fingerprints, cache_index, 'online', dates))
+    else:
+        postgres_data, cdc_position, online_fingerprints, dates = extract_postgres_snapshot(
+            bootstrap_cdc, stored_online if stored else None, csv_dates, cache_index)
+    
+    if dates is None or dates:
+        # Only partitions without an up-to-date cached partial are recomputed from rows
+        selected = set(online_fingerprints) | set(in_store_fingerprints) if dates is None else dates
+        online_read = uncached_partitions(online_fingerprints, cache_index, 'online', selected)
+        in_store_read = uncached_partitions(in_store_fingerprints, cache_index, 'in_store', selected)
+        if in_store_read and csv_data is None:
+            csv_data, csv_state, _ = extract_csv_tail(csv_path, full=True)
+        if csv_data is None:
+            csv_data = pd.DataFrame(columns=CDC_COLUMNS[:-1])
+        elif dates is not None or in_store_read != set(in_store_fingerprints):
+            # Rows whose sale_date doesn't parse belong to no partition; they are kept for
+            # validation, so every run mode counts and quarantines them alike
+            keys = sale_date_keys(csv_data)
+            csv_data = csv_data[keys.isin(in_store_read) | keys.isna()]
+        
+        # Transform
+        partials, rejected_rows = transform_data(postgres_data, csv_data, by_source=True)
+        fresh = {('online', day): online_fingerprints[day] for day in online_read}
+        fresh.update({('in_store', day): in_store_fingerprints[day] for day in in_store_read})
+        cached = [(source, day) for source, partitions in (('online', online_fingerprints), ('in_store', in_store_fingerprints))
+                  for day in selected if day in partitions and (source, day) not in fresh]
+        transformed_data = assemble_daily_facts(partials, fresh, cached, cache_index)
+    else:
+        transformed_data = None
+        rejected_rows = {}
+    
+    return {
+        'daily_facts': transformed_data,
+        'dates': dates,
+        'scope': scope,
+        'online_fingerprints': online_fingerprints,
+        'in_store_fingerprints': in_store_fingerprints,
+        'csv_file_fingerprint': csv_file_fingerprint,
+        'cdc_position': cdc_position,
+        'csv_state': csv_state,
+        'rejected_rows': rejected_rows,
+        'dq_settings': dq_settings_digest(),
+    }
+
+def run_etl_pipeline(csv_path, execution_date=None, bootstrap_cdc=False, force=False, end_date=None, run_id=None):
+    """Run the ETL pipeline, reloading only the sale dates whose source data changed
+    
+    execution_date limits the run to that day, or to the inclusive range up to
+    end_date. Days whose per-source partial aggregate is cached for the current
+    fingerprint are merged from the cache instead of being extracted again.
+    Calling again with the run_id of a failed run resumes it from its checkpoint.
+    Ranged runs raise ValueError while change capture is active, and become a
+    forced full rebuild while daily_sales is empty.
+    """
+    if execution_date and cdc_bootstrapped():
+        raise ValueError(RANGED_RUN_WITH_CDC)
+    if execution_date and not has_daily_facts():
+        # The all-time totals are refreshed from the rollups of daily_sales, so on a warehouse
+        # upgraded with an empty daily_sales a ranged load would replace them with the range's sales
+        print("daily_sales is empty, running a full rebuild instead of the ranged run")
+        execution_date, end_date, force = None, None, True
+    print(f"Starting ETL pipeline at {datetime.now()}")
+    print(f"Processing date: {execution_date if execution_date else 'all dates'}"
+          + (f" to {end_date}" if execution_date and end_date else ""))
+    
+    # Extract and transform, unless an earlier attempt of this run already did
+    plan = resume_stage(run_id, STAGE_TRANSFORM)
+    if plan is None:
+        plan = plan_etl_run(csv_path, execution_date, bootstrap_cdc, force, end_date)
+        if run_id and plan['daily_facts'] is not None:
+            checkpoint_stage(run_id, STAGE_TRANSFORM, plan)
+    dates, scope = plan['dates'], plan['scope']
+    
+    if plan['daily_facts'] is not None:
+        # Load - a full rebuild is staged and swapped in, changed dates are replaced in place
+        load_to_mysql(plan['daily_facts'], LOAD_MODE_SWAP if dates is None else LOAD_MODE_REPLACE, dates, run_id=run_id)
+    else:
+        print("Sources unchanged since the last load, nothing to reload")
+    
+    # Store the fingerprints of what was loaded
+    fingerprints = {('online', key): fp for key, fp in plan['online_fingerprints'].items()}
+    fingerprints.update({('in_store', key): fp for key, fp in plan['in_store_fingerprints'].items()})
+    if scope is not None:
+        save_fingerprints({key: fp for key, fp in fingerprints.items() if key[1] in scope}, scope)
+    else:
+        fingerprints[('in_store', '*')] = plan['csv_file_fingerprint']
+        fingerprints[DQ_MARKER] = plan['dq_settings']
+        if plan['cdc_position'] is not None:
+            # Saved with the fingerprints, so capture only counts as initialised once its base load is in
+            fingerprints[CDC_MARKER] = cdc_marker(plan['cdc_position'])
+        save_fingerprints(fingerprints)
+        acknowledge_postgres_changes(plan['cdc_position'])
+        if plan['csv_state']:
+            save_csv_state(csv_path, plan['csv_state'])
+    if run_id:
+        clear_checkpoints(run_id)
+    
+    print(f"ETL pipeline completed at {datetime.now()}")
+    return {"skipped": dates is not None and not dates,
+            "reloaded_dates": "all" if dates is None else len(dates),
+            "rejected_rows": plan['rejected_rows']}
+
+def run_incremental_pipeline(csv_path, run_id=None):
+    """Apply captured online_sales changes and newly appended CSV rows to the warehouse
+    
+    Calling again with the run_id of a failed run resumes it from its checkpoint,
+    without applying its deltas twice.
+    """
+    print(f"Starting incremental ETL pipeline at {datetime.now()}")
+    
+    # An earlier attempt that fell back to a full load resumes that load
+    if run_id and has_checkpoint(run_id, STAGE_TRANSFORM):
+        return run_etl_pipeline(csv_path, run_id=run_id)
+    
+    plan = resume_stage(run_id, STAGE_INCREMENTAL_TRANSFORM)
+    if plan is None:
+        # Extract - a slot or change table whose bootstrap load never finished has no base
+        # load under it, so the full load is run (again) and picks up from the capture
+        marker = load_marker(CDC_MARKER)
+        if marker is None:
+            print("Change capture bootstrap load not recorded, running a full load first")
+            return run_etl_pipeline(csv_path, bootstrap_cdc=True, run_id=run_id)
+        if load_marker(DQ_MARKER) != dq_settings_digest():
+            # Deltas validated under new data-quality settings can't be added to facts built under others
+            print("Data-quality settings changed since the last full load, running a full load")
+            return run_etl_pipeline(csv_path, run_id=run_id)
+        changes, position = extract_postgres_changes(snapshot_filter(marker))
+        if changes is None:
+            # Change capture isn't set up yet: start it with a consistent full load
+            print("Change capture not initialised, running a full load first")
+            return run_etl_pipeline(csv_path, bootstrap_cdc=True, run_id=run_id)
+        csv_data, csv_state, csv_reset = extract_csv_tail(csv_path)
+        if csv_reset:
+            # Rows can't be added as deltas when the file was replaced under us
+            print("CSV has no saved offset or was truncated/rotated, running a full load")
+            return run_etl_pipeline(csv_path, run_id=run_id)
+        
+        plan = {'deltas': None, 'position': position, 'csv_state': csv_state,
+                'applied_changes': len(changes) + len(csv_data), 'rejected_rows': {}}
+        if plan['applied_changes']:
+            # Transform - appended CSV rows are plain inserts
+            plan['deltas'], plan['rejected_rows'] = transform_data(changes, csv_data)
+        if run_id and plan['deltas'] is not None:
+            checkpoint_stage(run_id, STAGE_INCREMENTAL_TRANSFORM, plan)
+    
+    if plan['deltas'] is not None:
+        # Load
+        load_to_mysql(plan['deltas'], LOAD_MODE_DELTA, run_id=run_id)
+    acknowledge_postgres_changes(plan['position'])
+    save_csv_state(csv_path, plan['csv_state'])
+    if run_id:
+        clear_checkpoints(run_id)
+    
+    print(f"Incremental ETL pipeline completed at {datetime.now()}")
+    return {"skipped": not plan['applied_changes'],
+            "applied_changes": plan['applied_changes'],
+            "rejected_rows": plan['rejected_rows']}
+
+def follow_csv(csv_path, poll_interval=5):
+    """Micro-batch appended CSV rows and captured online_sales changes into the warehouse as they arrive"""
+    print(f"Following {csv_path} and the online_sales change capture every {poll_interval}s, press Ctrl+C to stop")
+    while True:
+        # Every poll runs: online_sales changes arrive whether or not the CSV grew, and an
+        # unchanged CSV costs one seek to its saved offset
+        run_incremental_pipeline(csv_path)
+        time.sleep(poll_interval)
@@ -0,0 +1,72 @@
+"""
+Retries with exponential backoff for transient database errors (dropped connections,
+deadlocks, lock wait timeouts), so a brief outage costs one repeated operation, not a run.
+"""
+
+import time
+import random
+import functools
+
+from retail_etl.config import get_config
+
+# MySQL errors worth retrying: the server or the connection is briefly unavailable, or
+# the transaction lost a lock conflict and was rolled back
+TRANSIENT_MYSQL_ERRNOS = {
+    1040,  # ER_CON_COUNT_ERROR: too many connections
+    1205,  # ER_LOCK_WAIT_TIMEOUT
+    1213,  # ER_LOCK_DEADLOCK
+    2003,  # CR_CONN_HOST_ERROR: can't connect
+    2006,  # CR_SERVER_GONE_ERROR
+    2013,  # CR_SERVER_LOST
+    2055,  # CR_SERVER_LOST_EXTENDED
+}
+
+# PostgreSQL SQLSTATEs worth retrying besides class 08 (connection exception)
+TRANSIENT_POSTGRES_CODES = {
+    '40001',  # serialization_failure
+    '40P01',  # deadlock_detected
+    '57P01',  # admin_shutdown
+    '57P02',  # crash_shutdown
+    '57P03',  # cannot_connect_now
+}
+
+def is_transient(error):
+    """Return whether a database error is likely to succeed when the operation is repeated"""
+    module = type(error).__module__
+    if module.startswith('mysql.connector'):
+        return getattr(error, 'errno', None) in TRANSIENT_MYSQL_ERRNOS
+    if module.startswith('psycopg2'):
+        code = getattr(error, 'pgcode', None)
+        if code is None:
+            # Raised client side, without a SQLSTATE, when the connection dropped
+            return type(error).__name__ in ('OperationalError', 'InterfaceError')
+        return code.startswith('08') or code in TRANSIENT_POSTGRES_CODES
+    return False
+
+def backoff_delay(attempt):
+    """Return the wait in seconds after failed attempt number attempt (1-based)"""
+    config = get_config()
+    delay = min(config.retry_max_delay, config.retry_base_delay * 2 ** (attempt - 1))
+    # Jitter keeps processes that failed together from retrying in lockstep
+    return delay * random.uniform(0.5, 1.0)
+
+def retry_transient(func):
+    """Decorate func to be repeated with exponential backoff while it fails with a transient database error
+    
+    func must be safe to repeat: it borrows its own connection and either commits
+    its work in one transaction or only reads.
+    """
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        attempts = get_config().retry_attempts
+        for attempt in range(1, attempts + 1):
+            try:
+                return func(*args, **kwargs)
+            except Exception as e:
+                if attempt == attempts or not is_transient(e):
+                    raise
+                delay = backoff_delay(attempt)
+                print(f"Transient database error in {func.__name__}: {e}; "
+                      f"retrying in {delay:.1f}s (attempt {attempt + 1} of {attempts})")
+                time.sleep(delay)
+    return wrapper
@@ -0,0 +1,131 @@
+"""
+Transform: data-quality checks with quarantine, then aggregation to the daily
+(sale_date, product_id) grain.
+"""
+
+import os
+from datetime import datetime
+
+from retail_etl.cache import save_aggregate_partials, load_aggregate_partials, evict_aggregate_cache
+from retail_etl.config import get_config
+from retail_etl.extract import CDC_COLUMNS
+
+# Data-quality rules in priority order; a rejected row is reported under the first rule it fails
+DQ_RULES = [
+    'missing_value',       # product_id, quantity or sale_amount is empty
+    'non_numeric',         # a numeric field doesn't parse, or product_id isn't a whole number
+    'unknown_product',     # product_id isn't positive or isn't in the configured known_product_ids
+    'negative_quantity',
+    'negative_amount',
+    'out_of_range_date',   # sale_date doesn't parse or lies outside dq_min_sale_date..tomorrow
+    'duplicate_sale_id',   # sale_id seen earlier in the same source and sale_date partition
+]
+
+def validate_sales_data(df):
+    """Check every data-quality rule in one vectorized pass over the combined rows"""
+    import numpy as np
+    import pandas as pd
+    config = get_config()
+    product_id = pd.to_numeric(df['product_id'], errors='coerce')
+    quantity = pd.to_numeric(df['quantity'], errors='coerce')
+    sale_amount = pd.to_numeric(df['sale_amount'], errors='coerce')
+    sale_date = df['sale_date']
+    
+    missing = df[['product_id', 'quantity', 'sale_amount']].isna().any(axis=1)
+    non_numeric = product_id.isna() | quantity.isna() | sale_amount.isna() | (product_id % 1 != 0)
+    unknown_product = product_id <= 0
+    if config.known_product_ids:
+        unknown_product |= ~product_id.isin(config.known_product_ids)
+    latest_date = pd.Timestamp.now().normalize() + pd.Timedelta(days=1)
+    out_of_range_date = sale_date.isna() | (sale_date < pd.Timestamp(config.dq_min_sale_date)) | (sale_date > latest_date)
+    
+    # CDC deltas legitimately repeat a sale_id (old and new side of an update). Duplicates are
+    # only looked for within a partition, which every run mode reads whole, so the outcome
+    # doesn't depend on which other dates the run read (and a cached partial stays valid)
+    full_rows = df['sign'].isna()
+    duplicate = full_rows & df['sale_id'].notna() & df[full_rows].duplicated(['source', 'sale_date', 'sale_id']).reindex(df.index, fill_value=False)
+    
+    masks = [missing, non_numeric, unknown_product, quantity < 0, sale_amount < 0, out_of_range_date, duplicate]
+    reason = pd.Series(np.select(masks, DQ_RULES, default=''), index=df.index)
+    rejected = reason != ''
+    
+    valid = pd.DataFrame({
+        'source': df['source'][~rejected],
+        'sale_date': sale_date[~rejected],
+        'product_id': product_id[~rejected].astype('int64'),
+        'quantity': quantity[~rejected] * df['sign'][~rejected].fillna(1),
+        'sale_amount': sale_amount[~rejected] * df['sign'][~rejected].fillna(1),
+    })
+    rejects = df[rejected].assign(reason=reason[rejected])
+    counts = {rule: 0 for rule in DQ_RULES}
+    counts.update(reason[rejected].value_counts().to_dict())
+    return valid, rejects, counts
+
+def write_quarantine(rejects):
+    """Write rejected rows with their reason code to a gzipped CSV in the quarantine directory"""
+    quarantine_dir = get_config().quarantine_dir
+    os.makedirs(quarantine_dir, exist_ok=True)
+    path = os.path.join(quarantine_dir, f"rejects_{datetime.now().strftime('%Y%m%d_%H%M%S_%f')}.csv.gz")
+    rejects.to_csv(path, index=False, compression='gzip', date_format='%Y-%m-%d')
+    return path
+
+def transform_data(postgres_df, csv_df, by_source=False):
+    """Validate, then aggregate the data to the daily (sale_date, product_id) grain
+    
+    Returns the aggregates and the reject counts per rule. With by_source the
+    aggregates are kept apart per source, as partials for the aggregate cache.
+    """
+    import pandas as pd
+    print("Transforming data...")
+    
+    # Parse sale dates per source before combining, so mixed formats
+    # (date objects from PostgreSQL, strings from the CSV) don't coerce to NaT
+    frames = []
+    for source, df in (('online', postgres_df), ('in_store', csv_df)):
+        df = df.reindex(columns=CDC_COLUMNS)
+        df['sale_date'] = pd.to_datetime(df['sale_date'].astype(str).str.strip(), errors='coerce').dt.normalize()
+        df['source'] = source
+        frames.append(df)
+    
+    # Combine data from both sources
+    df_combined = pd.concat(frames, ignore_index=True)
+    
+    # Data quality - route rows failing any rule to the quarantine file
+    df_valid, rejects, counts = validate_sales_data(df_combined)
+    if not rejects.empty:
+        path = write_quarantine(rejects)
+        summary = ', '.join(f"{rule}={count}" for rule, count in counts.items() if count)
+        print(f"Quarantined {len(rejects)} rows ({summary}) to {path}")
+    
+    # Aggregate data to calculate daily totals for each product_id
+    keys = ['source', 'sale_date', 'product_id'] if by_source else ['sale_date', 'product_id']
+    df_aggregated = df_valid.groupby(keys).agg({
+        'quantity': 'sum',
+        'sale_amount': 'sum'
+    }).reset_index()
+    
+    # Rename columns to match the target schema
+    df_aggregated.columns = keys + ['total_quantity', 'total_sale_amount']
+    
+    print(f"Transformed data to {len(df_aggregated)} {'partial' if by_source else 'daily'} aggregated rows")
+    return df_aggregated, counts
+
+def assemble_daily_facts(partials, fresh, cached, cache_index):
+    """Cache the freshly computed partials, then merge them with the cached ones into daily facts
+    
+    fresh maps each recomputed (source, sale_date) to its fingerprint, cached
+    lists the (source, sale_date) partitions to take from cache_index.
+    """
+    import pandas as pd
+    save_aggregate_partials(partials, fresh, cache_index)
+    frames = [partials] + load_aggregate_partials(cache_index[key][1] for key in cached)
+    evict_aggregate_cache()
+    
+    # Sum the per-source partials of each day
+    df_daily = pd.concat(frames, ignore_index=True).groupby(['sale_date', 'product_id']).agg({
+        'total_quantity': 'sum',
+        'total_sale_amount': 'sum'
+    }).reset_index()
+    
+    print(f"Assembled {len(df_daily)} daily rows from {len(fresh)} recomputed and {len(cached)} cached partitions")
+    return df_daily
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+Benchmark the ranked aggregated_sales queries behind /sales/top and /sales/above.
+
+Builds a scratch copy of aggregated_sales (aggregated_sales_bench, 10M rows by default)
+in the configured warehouse, times each query with its covering index ignored and
+used, and checks with EXPLAIN that the indexed plan reads only the index. The scratch
+table is dropped afterwards unless --keep is given.
+"""
+
+import os
+import sys
+import time
+import argparse
+import statistics
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from retail_etl.connectors import mysql_sink
+from retail_etl.load import WAREHOUSE_INDEXES
+
+TABLE = 'aggregated_sales_bench'
+CHUNK_ROWS = 1000000
+RUNS = 5
+
+# (name, index, query) - {hint} is replaced by the IGNORE INDEX / FORCE INDEX clause
+QUERIES = [
+    ('top 10 by revenue', 'idx_aggregated_sales_revenue',
+     f"SELECT product_id, total_quantity, total_sale_amount FROM {TABLE} {{hint}} "
+     "ORDER BY total_sale_amount DESC LIMIT 10"),
+    ('top 10 by quantity', 'idx_aggregated_sales_quantity',
+     f"SELECT product_id, total_quantity, total_sale_amount FROM {TABLE} {{hint}} "
+     "ORDER BY total_quantity DESC LIMIT 10"),
+    ('revenue >= 99900', 'idx_aggregated_sales_revenue',
+     f"SELECT product_id, total_quantity, total_sale_amount FROM {TABLE} {{hint}} "
+     "WHERE total_sale_amount >= 99900 ORDER BY total_sale_amount DESC LIMIT 1000"),
+    ('quantity >= 990', 'idx_aggregated_sales_quantity',
+     f"SELECT product_id, total_quantity, total_sale_amount FROM {TABLE} {{hint}} "
+     "WHERE total_quantity >= 990 ORDER BY total_quantity DESC LIMIT 1000"),
+]
+
+def create_bench_table(conn, cursor, rows):
+    """Create the scratch table with the warehouse indexes and fill it with pseudo-random totals"""
+    indexes = ''.join(f",\n        INDEX {name} ({columns})" for name, columns in WAREHOUSE_INDEXES['aggregated_sales'])
+    cursor.execute(f"DROP TABLE IF EXISTS {TABLE}")
+    cursor.execute(f"""
+    CREATE TABLE {TABLE} (
+        product_id INT PRIMARY KEY,
+        total_quantity INT NOT NULL,
+        total_sale_amount DECIMAL(12, 2) NOT NULL{indexes}
+    )
+    """)
+
+    # A cross join of a digits table generates a million ids per statement without a round trip per row
+    cursor.execute("CREATE TEMPORARY TABLE bench_digits (d INT PRIMARY KEY)")
+    cursor.execute("INSERT INTO bench_digits VALUES (0), (1), (2), (3), (4), (5), (6), (7), (8), (9)")
+    for offset in range(0, rows, CHUNK_ROWS):
+        count = min(CHUNK_ROWS, rows - offset)
+        start = time.perf_counter()
+        cursor.execute(f"""
+        INSERT INTO {TABLE} (product_id, total_quantity, total_sale_amount)
+        SELECT n, (n * 7919) % 1000, ((n * 104729) % 10000000) / 100
+        FROM (
+            SELECT %s + a.d + b.d * 10 + c.d * 100 + d.d * 1000 + e.d * 10000 + f.d * 100000 AS n
+            FROM bench_digits a, bench_digits b, bench_digits c, bench_digits d, bench_digits e, bench_digits f
+        ) ids
+        WHERE n < %s
+        """, (offset + 1, offset + count + 1))
+        conn.commit()
+        print(f"  loaded {offset + count:,} / {rows:,} rows ({time.perf_counter() - start:.1f}s)")
+    cursor.execute("DROP TEMPORARY TABLE bench_digits")
+    cursor.execute(f"ANALYZE TABLE {TABLE}")
+    cursor.fetchall()
+
+def time_query(cursor, query):
+    """Return the median wall time of running query to completion"""
+    timings = []
+    for _ in range(RUNS):
+        start = time.perf_counter()
+        cursor.execute(query)
+        cursor.fetchall()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings)
+
+def explain(cursor, query):
+    """Return (key, Extra) of the query plan"""
+    cursor.execute(f"EXPLAIN {query}")
+    columns = [column[0] for column in cursor.description]
+    plan = dict(zip(columns, cursor.fetchone()))
+    cursor.fetchall()
+    return plan['key'], plan['Extra'] or ''
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, default=10000000, help='rows in the scratch table (default: 10M)')
+    parser.add_argument('--keep', action='store_true', help=f'keep {TABLE} for further experiments')
+    args = parser.parse_args()
+
+    with mysql_sink().connection() as conn:
+        cursor = conn.cursor()
+        print(f"Creating {TABLE} with {args.rows:,} rows...")
+        create_bench_table(conn, cursor, args.rows)
+
+        failures = []
+        try:
+            print(f"\nMedian over {RUNS} runs")
+            print(f"  {'query':<22} {'table scan':>12} {'index':>12} {'speedup':>9}")
+            for name, index, query in QUERIES:
+                scan = time_query(cursor, query.format(hint=f"IGNORE INDEX ({index})"))
+                indexed = time_query(cursor, query.format(hint=f"FORCE INDEX ({index})"))
+                print(f"  {name:<22} {scan * 1000:>10.1f}ms {indexed * 1000:>10.1f}ms {scan / indexed:>8.0f}x")
+
+                # The plan must use the index and read nothing but it ("Using index")
+                key, extra = explain(cursor, query.format(hint=f"FORCE INDEX ({index})"))
+                if key != index or 'Using index' not in extra:
+                    failures.append(f"{name}: key={key}, Extra={extra}")
+        finally:
+            if not args.keep:
+                cursor.execute(f"DROP TABLE IF EXISTS {TABLE}")
+            cursor.close()
+
+    if failures:
+        print("\nQueries not served from their covering index:")
+        for failure in failures:
+            print(f"  {failure}")
+        sys.exit(1)
+    print("\nEvery query is an index-only read of its covering index")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""
+Measure the cold import time of the backend, the retail_etl package and the Airflow DAG files.
+
+Each file is imported in a fresh interpreter several times and the median is reported,
+together with the heavy modules (pandas, numpy, database drivers) the import pulled in.
+DAG files are only measured when Airflow is installed; run
+`airflow dags report` inside the scheduler container for the parse times it sees.
+"""
+
+import os
+import sys
+import json
+import statistics
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+TARGETS = [
+    'docker-microservices/backend/app.py',
+    'retail_etl/__init__.py',
+    'docker-airflow/retail_sales_etl/etl_pipeline.py',
+    'docker-airflow/dags/retail_sales_etl_dag.py',
+    'docker-airflow/dags/retail_sales_cdc_dag.py',
+]
+HEAVY_MODULES = ['pandas', 'numpy', 'psycopg2', 'mysql.connector']
+RUNS = 7
+
+# Runs in the child interpreter: import the file by path and report the time and heavy modules loaded
+PROBE = """
+import sys, time, json, importlib.util
+path, heavy = sys.argv[1], sys.argv[2:]
+sys.path.insert(0, '{root}')
+start = time.perf_counter()
+spec = importlib.util.spec_from_file_location('probe_target', path)
+module = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(module)
+elapsed = time.perf_counter() - start
+print(json.dumps({{'seconds': elapsed, 'loaded': [name for name in heavy if name in sys.modules]}}))
+"""
+
+def measure(path):
+    """Return (median seconds, heavy modules loaded) for importing path, or None if it can't be imported"""
+    probe = PROBE.format(root=ROOT)
+    timings = []
+    loaded = []
+    for _ in range(RUNS):
+        result = subprocess.run([sys.executable, '-c', probe, path] + HEAVY_MODULES,
+                                capture_output=True, text=True, cwd=os.path.dirname(path))
+        if result.returncode != 0:
+            print(f"  could not import {os.path.relpath(path, ROOT)}: {result.stderr.strip().splitlines()[-1]}")
+            return None
+        sample = json.loads(result.stdout.strip().splitlines()[-1])
+        timings.append(sample['seconds'])
+        loaded = sample['loaded']
+    return statistics.median(timings), loaded
+
+def main():
+    print(f"Median cold import time over {RUNS} runs ({sys.executable}, Python {sys.version.split()[0]})")
+    for target in TARGETS:
+        result = measure(os.path.join(ROOT, target))
+        if result:
+            seconds, loaded = result
+            print(f"  {target:<50} {seconds * 1000:8.1f} ms   loads: {', '.join(loaded) or 'none'}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,45 @@
+"""Aggregate cache: the file index and which partitions still need reading"""
+
+import pytest
+
+from retail_etl.cache import aggregate_cache_index, aggregate_cache_key, uncached_partitions
+from retail_etl.config import configure, get_config
+
+@pytest.fixture
+def cache_dir(tmp_path):
+    previous = get_config()
+    configure(aggregate_cache_dir=str(tmp_path), dq_min_sale_date='2000-01-01', known_product_ids=())
+    yield tmp_path
+    configure(previous)
+
+def test_index_parses_source_date_and_key_from_file_names(cache_dir):
+    for name in ['online_2024-03-01_0123456789abcdef.pkl', 'in_store_2024-03-02_fedcba9876543210.pkl',
+                 'online_2024-03-03_0123456789abcdef.pkl.tmp', 'notes.txt']:
+        (cache_dir / name).write_bytes(b'')
+    assert aggregate_cache_index() == {
+        ('online', '2024-03-01'): ('0123456789abcdef', str(cache_dir / 'online_2024-03-01_0123456789abcdef.pkl')),
+        ('in_store', '2024-03-02'): ('fedcba9876543210', str(cache_dir / 'in_store_2024-03-02_fedcba9876543210.pkl')),
+    }
+
+def test_missing_cache_directory_is_an_empty_index(cache_dir):
+    configure(aggregate_cache_dir=str(cache_dir / 'missing'))
+    assert aggregate_cache_index() == {}
+
+def test_uncached_partitions_are_those_without_a_partial_for_their_fingerprint(cache_dir):
+    fingerprints = {'2024-03-01': '2:10', '2024-03-02': '1:5', '2024-03-03': '4:7'}
+    cache_index = {
+        ('online', '2024-03-01'): (aggregate_cache_key('2:10'), 'a.pkl'),
+        ('online', '2024-03-02'): (aggregate_cache_key('1:4'), 'b.pkl'),
+        ('in_store', '2024-03-03'): (aggregate_cache_key('4:7'), 'c.pkl'),
+    }
+    # 2024-03-04 has no source rows, so there is nothing to read
+    dates = ['2024-03-01', '2024-03-02', '2024-03-03', '2024-03-04']
+    assert uncached_partitions(fingerprints, cache_index, 'online', dates) == {'2024-03-02', '2024-03-03'}
+
+def test_changing_the_data_quality_rules_invalidates_cached_partials(cache_dir):
+    key = aggregate_cache_key('2:10')
+    cache_index = {('online', '2024-03-01'): (key, 'a.pkl')}
+    assert uncached_partitions({'2024-03-01': '2:10'}, cache_index, 'online', ['2024-03-01']) == set()
+    configure(known_product_ids=(1, 2, 3))
+    assert aggregate_cache_key('2:10') != key
+    assert uncached_partitions({'2024-03-01': '2:10'}, cache_index, 'online', ['2024-03-01']) == {'2024-03-01'}
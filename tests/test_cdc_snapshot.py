@@ -0,0 +1,44 @@
+"""CDC markers: which captured slot changes a full load's snapshot already contains"""
+
+import pytest
+
+from retail_etl.extract import cdc_marker, lsn_value, snapshot_filter, xid_visible
+
+def test_slot_marker_round_trips_lsn_and_snapshot():
+    marker = cdc_marker(('slot', '16/B374D848', '741:745:741,743'))
+    assert marker == 'slot 16/B374D848 741:745:741,743'
+    assert snapshot_filter(marker) == ('16/B374D848', '741:745:741,743')
+
+@pytest.mark.parametrize('position', [('table', 42), ('slot', '0/1000')])
+def test_markers_without_a_snapshot_skip_nothing(position):
+    assert snapshot_filter(cdc_marker(position)) is None
+
+def test_old_markers_skip_nothing():
+    assert snapshot_filter('slot') is None
+    assert snapshot_filter(None) is None
+
+def test_lsn_orders_by_both_halves():
+    assert lsn_value('0/FFFFFFFF') < lsn_value('1/0') < lsn_value('16/B374D848')
+    assert lsn_value('16/B374D848') == (0x16 << 32) | 0xB374D848
+
+@pytest.mark.parametrize('xid, visible', [
+    (700, True),    # finished before the snapshot's xmin
+    (740, True),
+    (741, False),   # xmin, still in progress when the snapshot was taken
+    (742, True),
+    (743, False),
+    (745, False),   # started after the snapshot
+    (900, False),
+])
+def test_xid_visibility(xid, visible):
+    assert xid_visible(xid, '741:745:741,743') is visible
+
+def test_xid_visibility_across_the_epoch():
+    # Epoch 1: the 32-bit xids wrapped around since xmin
+    xmin = (1 << 32) - 10
+    snapshot = f"{xmin}:{xmin + 20}:{xmin},{(1 << 32) + 2}"
+    assert xid_visible(4294967280, snapshot) is True    # before xmin and the wraparound
+    assert xid_visible(4294967286, snapshot) is False   # xmin, in progress
+    assert xid_visible(1, snapshot) is True
+    assert xid_visible(2, snapshot) is False           # in progress
+    assert xid_visible(10, snapshot) is False          # after xmax
@@ -0,0 +1,40 @@
+"""Partition fingerprints: which sale_date partitions an incremental run has to reload"""
+
+import pytest
+
+from retail_etl.extract import changed_partitions, fingerprint_partitions
+
+def test_changed_added_and_removed_partitions_are_returned():
+    stored = {'2024-03-01': '2:10', '2024-03-02': '1:5', '2024-03-03': '4:7'}
+    current = {'2024-03-01': '2:10', '2024-03-02': '2:9', '2024-03-04': '1:1'}
+    assert changed_partitions(current, stored) == {'2024-03-02', '2024-03-03', '2024-03-04'}
+
+def test_scope_limits_the_partitions_compared():
+    stored = {'2024-03-01': '1:1', '2024-03-02': '1:5'}
+    current = {'2024-03-01': '1:2', '2024-03-02': '2:9'}
+    assert changed_partitions(current, stored, scope=['2024-03-02', '2024-03-05']) == {'2024-03-02'}
+
+def test_unchanged_partitions_need_no_reload():
+    fingerprints = {'2024-03-01': '2:10'}
+    assert changed_partitions(fingerprints, dict(fingerprints)) == set()
+    assert changed_partitions({}, {}) == set()
+
+def test_fingerprints_change_only_for_the_touched_date():
+    pd = pytest.importorskip('pandas')
+    df = pd.DataFrame({
+        'sale_id': [1, 2, 3],
+        'product_id': [5, 6, 5],
+        'quantity': [2, 1, 4],
+        'sale_amount': [10.5, 3.0, 21.0],
+        'sale_date': ['2024-03-01', '2024-03-01', '2024-03-02'],
+    })
+    before = fingerprint_partitions(df)
+    assert set(before) == {'2024-03-01', '2024-03-02'}
+    assert before['2024-03-01'].startswith('2:')
+    
+    updated = df.copy()
+    updated.loc[2, 'quantity'] = 5
+    assert changed_partitions(fingerprint_partitions(updated), before) == {'2024-03-02'}
+    
+    # Row order within a partition doesn't matter
+    assert fingerprint_partitions(df.iloc[::-1]) == before
@@ -0,0 +1,110 @@
+"""extract_csv_tail: following an append-only CSV from its saved offset"""
+
+from retail_etl.extract import extract_csv_tail, save_csv_state
+
+HEADER = "sale_id,product_id,quantity,sale_amount,sale_date\n"
+
+def write(path, text, mode='w'):
+    with open(path, mode) as f:
+        f.write(text)
+
+def follow(path):
+    """Extract the tail and save its offset, as a successful incremental run does"""
+    df, state, reset = extract_csv_tail(str(path))
+    save_csv_state(str(path), state)
+    return df, reset
+
+def test_first_run_reads_the_whole_file(tmp_path):
+    path = tmp_path / 'sales.csv'
+    write(path, HEADER + "1,10,1,5.0,2024-03-01\n2,11,2,8.0,2024-03-01\n")
+    df, reset = follow(path)
+    assert reset
+    assert df['sale_id'].tolist() == [1, 2]
+
+def test_appended_rows_are_read_from_the_saved_offset(tmp_path):
+    path = tmp_path / 'sales.csv'
+    write(path, HEADER + "1,10,1,5.0,2024-03-01\n")
+    follow(path)
+    write(path, "2,11,2,8.0,2024-03-02\n3,12,1,3.0,2024-03-02\n", 'a')
+    df, reset = follow(path)
+    assert not reset
+    assert df['sale_id'].tolist() == [2, 3]
+    
+    df, reset = follow(path)
+    assert not reset
+    assert df.empty
+
+def test_partially_written_last_line_waits_for_the_next_run(tmp_path):
+    path = tmp_path / 'sales.csv'
+    write(path, HEADER + "1,10,1,5.0,2024-03-01\n")
+    follow(path)
+    write(path, "2,11,2,8.0,2024-03-02\n3,12,1,3", 'a')
+    df, _ = follow(path)
+    assert df['sale_id'].tolist() == [2]
+    
+    write(path, ".0,2024-03-02\n", 'a')
+    df, reset = follow(path)
+    assert not reset
+    assert df['sale_id'].tolist() == [3]
+    assert df['sale_amount'].tolist() == [3.0]
+
+def test_truncated_file_is_reread_in_full(tmp_path):
+    path = tmp_path / 'sales.csv'
+    write(path, HEADER + "1,10,1,5.0,2024-03-01\n2,11,2,8.0,2024-03-01\n")
+    follow(path)
+    write(path, HEADER + "7,10,1,5.0,2024-03-05\n")
+    df, reset = follow(path)
+    assert reset
+    assert df['sale_id'].tolist() == [7]
+
+def test_rotated_file_of_the_same_length_is_reread_in_full(tmp_path):
+    path = tmp_path / 'sales.csv'
+    write(path, HEADER + "1,10,1,5.0,2024-03-01\n")
+    follow(path)
+    # Same size past the saved offset, but the last consumed line changed
+    write(path, HEADER + "9,10,1,5.0,2024-03-01\n4,11,2,8.0,2024-03-02\n")
+    df, reset = follow(path)
+    assert reset
+    assert df['sale_id'].tolist() == [9, 4]
+
+def test_changed_header_is_reread_in_full(tmp_path):
+    path = tmp_path / 'sales.csv'
+    write(path, HEADER + "1,10,1,5.0,2024-03-01\n")
+    follow(path)
+    write(path, HEADER.replace('sale_amount', 'amount') + "1,10,1,5.0,2024-03-01\n2,11,2,8.0,2024-03-02\n")
+    df, reset = follow(path)
+    assert reset
+    assert 'amount' in df.columns
+    assert len(df) == 2
+
+def test_full_extract_ignores_the_saved_offset(tmp_path):
+    path = tmp_path / 'sales.csv'
+    write(path, HEADER + "1,10,1,5.0,2024-03-01\n")
+    follow(path)
+    write(path, "2,11,2,8.0,2024-03-02\n", 'a')
+    df, state, reset = extract_csv_tail(str(path), full=True)
+    assert reset
+    assert df['sale_id'].tolist() == [1, 2]
+    assert state['offset'] == path.stat().st_size
+
+def test_full_extract_leaves_a_partially_written_last_line_for_later(tmp_path):
+    path = tmp_path / 'sales.csv'
+    write(path, HEADER + "1,10,1,5.0,2024-03-01\n2,11,2,8")
+    df, state, reset = extract_csv_tail(str(path), full=True)
+    save_csv_state(str(path), state)
+    assert df['sale_id'].tolist() == [1]
+    
+    write(path, ".0,2024-03-02\n", 'a')
+    df, reset = follow(path)
+    assert not reset
+    assert df['sale_id'].tolist() == [2]
+    assert df['sale_date'].tolist() == ['2024-03-02']
+
+def test_reread_after_truncation_leaves_a_partially_written_last_line_for_later(tmp_path):
+    path = tmp_path / 'sales.csv'
+    write(path, HEADER + "1,10,1,5.0,2024-03-01\n2,11,2,8.0,2024-03-01\n")
+    follow(path)
+    write(path, HEADER + "7,10,1,5.0,2024-03-05\n8,11")
+    df, reset = follow(path)
+    assert reset
+    assert df['sale_id'].tolist() == [7]
@@ -0,0 +1,22 @@
+"""Checks of the warehouse migration list that need no database"""
+
+import re
+
+from retail_etl.migrations import MIGRATIONS
+
+# Tables of the first release, which every warehouse has before any migration runs
+BASELINE_TABLES = {'aggregated_sales'}
+
+def test_versions_are_unique_and_ascending():
+    versions = [version for version, _, _ in MIGRATIONS]
+    assert versions == sorted(set(versions))
+
+def test_altered_tables_are_created_by_an_earlier_migration():
+    # An ALTER of a table the warehouse lacks fails with 1146 and stops every later migration
+    created = set(BASELINE_TABLES)
+    for version, _, statements in MIGRATIONS:
+        for statement in statements:
+            altered = re.match(r'\s*ALTER TABLE (\w+)', statement)
+            if altered:
+                assert altered.group(1) in created, f"migration {version} alters {altered.group(1)} before it exists"
+            created.update(re.findall(r'CREATE TABLE IF NOT EXISTS (\w+)', statement))
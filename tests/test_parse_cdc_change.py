@@ -0,0 +1,45 @@
+"""parse_cdc_change: test_decoding output lines to signed online_sales rows"""
+
+import pytest
+
+from retail_etl.extract import parse_cdc_change, parse_cdc_tuple
+
+ROW = ("sale_id[integer]:1 product_id[integer]:5 quantity[integer]:2 "
+       "sale_amount[numeric]:10.50 sale_date[date]:'2024-03-01'")
+NEW_ROW = ("sale_id[integer]:1 product_id[integer]:5 quantity[integer]:3 "
+           "sale_amount[numeric]:15.75 sale_date[date]:'2024-03-02'")
+
+def test_insert_is_a_positive_row():
+    assert parse_cdc_change(f"table public.online_sales: INSERT: {ROW}") == [
+        (1, {'sale_id': '1', 'product_id': '5', 'quantity': '2', 'sale_amount': '10.50', 'sale_date': '2024-03-01'}),
+    ]
+
+def test_delete_is_a_negative_row():
+    [(sign, row)] = parse_cdc_change(f"table public.online_sales: DELETE: {ROW}")
+    assert sign == -1
+    assert row['quantity'] == '2'
+
+def test_update_retracts_the_old_row_and_adds_the_new_one():
+    changes = parse_cdc_change(f"table public.online_sales: UPDATE: old-key: {ROW} new-tuple: {NEW_ROW}")
+    assert [(sign, row['quantity'], row['sale_date']) for sign, row in changes] == [
+        (-1, '2', '2024-03-01'),
+        (1, '3', '2024-03-02'),
+    ]
+
+def test_update_without_the_old_row_is_refused():
+    # Without REPLICA IDENTITY FULL test_decoding only prints the new row
+    with pytest.raises(ValueError, match='REPLICA IDENTITY FULL'):
+        parse_cdc_change(f"table public.online_sales: UPDATE: {NEW_ROW}")
+
+@pytest.mark.parametrize('line', [
+    'BEGIN 1234',
+    'COMMIT 1234',
+    f"table public.in_store_sales: INSERT: {ROW}",
+    "table public.online_sales: TRUNCATE: (no-flags)",
+])
+def test_other_lines_carry_no_rows(line):
+    assert parse_cdc_change(line) == []
+
+def test_tuple_values_are_unquoted_and_null_is_none():
+    row = parse_cdc_tuple("sale_id[integer]:7 note[character varying]:'it''s here' sale_date[date]:null")
+    assert row == {'sale_id': '7', 'note': "it's here", 'sale_date': None}
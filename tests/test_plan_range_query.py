@@ -0,0 +1,72 @@
+"""plan_range_query (backend API): covering a date range with monthly, weekly and daily rollups"""
+
+import os
+import sys
+import importlib.util
+from datetime import date, timedelta
+
+import pytest
+
+from retail_etl.load import period_end
+
+# The backend is a script, not a package: load its app.py as a module
+BACKEND_APP = os.path.join(os.path.dirname(__file__), '..', 'docker-microservices', 'backend', 'app.py')
+
+@pytest.fixture(scope='module')
+def backend():
+    pytest.importorskip('flask')
+    pytest.importorskip('flask_cors')
+    spec = importlib.util.spec_from_file_location('backend_app', BACKEND_APP)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[spec.name] = module
+    spec.loader.exec_module(module)
+    yield module
+    del sys.modules[spec.name]
+
+def covered_days(segments):
+    """Expand the planned segments back into the days they cover"""
+    days = []
+    for table, _, first, last in segments:
+        grain = {'monthly_sales': 'month', 'weekly_sales': 'week'}.get(table)
+        day = first
+        while day <= last:
+            next_day = period_end(day, grain) if grain else day + timedelta(days=1)
+            while day < next_day:
+                days.append(day)
+                day += timedelta(days=1)
+    return days
+
+def test_whole_months_collapse_into_one_monthly_segment(backend):
+    assert backend.plan_range_query(date(2024, 1, 1), date(2024, 2, 29)) == [
+        ['monthly_sales', 'month_start', date(2024, 1, 1), date(2024, 2, 1)],
+    ]
+
+def test_single_day_reads_daily_sales(backend):
+    assert backend.plan_range_query(date(2024, 3, 13), date(2024, 3, 13)) == [
+        ['daily_sales', 'sale_date', date(2024, 3, 13), date(2024, 3, 13)],
+    ]
+
+def test_mixed_range_uses_the_coarsest_whole_periods(backend):
+    # Feb 28-29 as days, March as a month, the week of Monday April 1, then April 8-10 as days
+    assert backend.plan_range_query(date(2024, 2, 28), date(2024, 4, 10)) == [
+        ['daily_sales', 'sale_date', date(2024, 2, 28), date(2024, 2, 29)],
+        ['monthly_sales', 'month_start', date(2024, 3, 1), date(2024, 3, 1)],
+        ['weekly_sales', 'week_start', date(2024, 4, 1), date(2024, 4, 1)],
+        ['daily_sales', 'sale_date', date(2024, 4, 8), date(2024, 4, 10)],
+    ]
+
+def test_week_crossing_the_range_end_is_read_as_days(backend):
+    # Monday 2024-03-04 starts a week, but the range stops on the Saturday
+    assert backend.plan_range_query(date(2024, 3, 4), date(2024, 3, 9)) == [
+        ['daily_sales', 'sale_date', date(2024, 3, 4), date(2024, 3, 9)],
+    ]
+
+@pytest.mark.parametrize('start, end', [
+    (date(2023, 12, 20), date(2024, 3, 5)),
+    (date(2024, 1, 1), date(2024, 12, 31)),
+    (date(2024, 2, 5), date(2024, 2, 25)),
+    (date(2023, 1, 31), date(2023, 3, 1)),
+])
+def test_every_day_is_covered_exactly_once(backend, start, end):
+    days = covered_days(backend.plan_range_query(start, end))
+    assert days == [start + timedelta(days=n) for n in range((end - start).days + 1)]
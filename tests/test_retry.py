@@ -0,0 +1,81 @@
+"""is_transient and retry_transient: which database errors are retried, and how often"""
+
+import pytest
+
+from retail_etl import retry
+from retail_etl.config import configure, get_config
+
+def driver_error(module, name, **attributes):
+    """Build an exception that looks like one raised by the given driver module"""
+    cls = type(name, (Exception,), {'__module__': module})
+    error = cls('boom')
+    error.__dict__.update(attributes)
+    return error
+
+@pytest.mark.parametrize('errno, transient', [(1213, True), (1205, True), (2013, True), (1062, False), (None, False)])
+def test_mysql_errors_are_classified_by_errno(errno, transient):
+    assert retry.is_transient(driver_error('mysql.connector.errors', 'DatabaseError', errno=errno)) is transient
+
+@pytest.mark.parametrize('pgcode, transient', [
+    ('08006', True),   # connection_failure, any class 08 code
+    ('08P01', True),
+    ('40P01', True),
+    ('57P01', True),
+    ('23505', False),  # unique_violation
+    ('42P01', False),  # undefined_table
+])
+def test_postgres_errors_are_classified_by_sqlstate(pgcode, transient):
+    assert retry.is_transient(driver_error('psycopg2.errors', 'Error', pgcode=pgcode)) is transient
+
+@pytest.mark.parametrize('name, transient', [('OperationalError', True), ('InterfaceError', True), ('ProgrammingError', False)])
+def test_postgres_errors_without_a_sqlstate_are_classified_by_type(name, transient):
+    assert retry.is_transient(driver_error('psycopg2', name, pgcode=None)) is transient
+
+def test_other_errors_are_not_transient():
+    assert retry.is_transient(ValueError('bad row')) is False
+    assert retry.is_transient(ConnectionError('reset')) is False
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    """Record the backoff waits instead of sleeping, with 3 attempts configured"""
+    previous = get_config()
+    configure(retry_attempts=3, retry_base_delay=1.0, retry_max_delay=1.5)
+    waits = []
+    monkeypatch.setattr(retry.time, 'sleep', waits.append)
+    yield waits
+    configure(previous)
+
+def flaky(errors):
+    """Return a retried function that raises the given errors in turn, then returns 'done'"""
+    calls = []
+    @retry.retry_transient
+    def operation():
+        calls.append(1)
+        if len(calls) <= len(errors):
+            raise errors[len(calls) - 1]
+        return 'done'
+    return operation, calls
+
+def test_transient_errors_are_retried_with_backoff(sleeps):
+    deadlock = driver_error('mysql.connector.errors', 'DatabaseError', errno=1213)
+    operation, calls = flaky([deadlock, deadlock])
+    assert operation() == 'done'
+    assert len(calls) == 3
+    assert len(sleeps) == 2
+    assert 0.5 <= sleeps[0] <= 1.0 and 0.75 <= sleeps[1] <= 1.5
+
+def test_other_errors_are_raised_straight_away(sleeps):
+    duplicate = driver_error('mysql.connector.errors', 'DatabaseError', errno=1062)
+    operation, calls = flaky([duplicate])
+    with pytest.raises(Exception, match='boom'):
+        operation()
+    assert len(calls) == 1
+    assert sleeps == []
+
+def test_retries_stop_after_the_configured_attempts(sleeps):
+    lost = driver_error('mysql.connector.errors', 'OperationalError', errno=2013)
+    operation, calls = flaky([lost] * 5)
+    with pytest.raises(Exception, match='boom'):
+        operation()
+    assert len(calls) == 3
+    assert len(sleeps) == 2
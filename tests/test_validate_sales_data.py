@@ -0,0 +1,91 @@
+"""validate_sales_data: data-quality rules, reject counts and the quarantine file"""
+
+import pytest
+
+from retail_etl.config import configure, get_config
+from retail_etl.transform import DQ_RULES, validate_sales_data, write_quarantine
+
+pd = pytest.importorskip('pandas')
+
+@pytest.fixture
+def dq_config(tmp_path):
+    """Known products 1-5, sales from 2024 on and a temporary quarantine directory"""
+    previous = get_config()
+    yield configure(known_product_ids=(1, 2, 3, 4, 5), dq_min_sale_date='2024-01-01',
+                    quarantine_dir=str(tmp_path / 'quarantine'))
+    configure(previous)
+
+def sales(*rows):
+    """Build combined rows as transform_data does: (source, sale_id, product_id, quantity, sale_amount, sale_date, sign)"""
+    df = pd.DataFrame(rows, columns=['source', 'sale_id', 'product_id', 'quantity', 'sale_amount', 'sale_date', 'sign'])
+    df['sale_date'] = pd.to_datetime(df['sale_date'])
+    return df
+
+def test_each_rule_rejects_its_row(dq_config):
+    valid, rejects, counts = validate_sales_data(sales(
+        ('online', 1, 1, 2, 10.0, '2024-03-01', None),
+        ('online', 2, None, 2, 10.0, '2024-03-01', None),
+        ('online', 3, 'abc', 2, 10.0, '2024-03-01', None),
+        ('online', 4, 1.5, 2, 10.0, '2024-03-01', None),
+        ('online', 5, 9, 2, 10.0, '2024-03-01', None),
+        ('online', 6, 1, -2, 10.0, '2024-03-01', None),
+        ('online', 7, 1, 2, -10.0, '2024-03-01', None),
+        ('online', 8, 1, 2, 10.0, '2023-12-31', None),
+        ('online', 9, 1, 2, 10.0, None, None),
+        ('online', 1, 1, 2, 10.0, '2024-03-01', None),
+    ))
+    assert list(rejects['sale_id']) == [2, 3, 4, 5, 6, 7, 8, 9, 1]
+    assert list(rejects['reason']) == [
+        'missing_value', 'non_numeric', 'non_numeric', 'unknown_product', 'negative_quantity',
+        'negative_amount', 'out_of_range_date', 'out_of_range_date', 'duplicate_sale_id',
+    ]
+    assert counts == {
+        'missing_value': 1, 'non_numeric': 2, 'unknown_product': 1, 'negative_quantity': 1,
+        'negative_amount': 1, 'out_of_range_date': 2, 'duplicate_sale_id': 1,
+    }
+    assert len(valid) == 1
+
+def test_a_row_is_reported_under_its_first_failing_rule(dq_config):
+    _, rejects, counts = validate_sales_data(sales(
+        ('online', 1, 9, -2, -10.0, '2023-01-01', None),
+        ('online', 2, 1, -2, -10.0, '2023-01-01', None),
+    ))
+    assert list(rejects['reason']) == ['unknown_product', 'negative_quantity']
+    assert sum(counts.values()) == 2
+
+def test_counts_list_every_rule(dq_config):
+    _, rejects, counts = validate_sales_data(sales(('online', 1, 1, 2, 10.0, '2024-03-01', None)))
+    assert rejects.empty
+    assert counts == {rule: 0 for rule in DQ_RULES}
+
+def test_duplicates_are_looked_for_within_a_source_and_sale_date(dq_config):
+    _, rejects, _ = validate_sales_data(sales(
+        ('online', 1, 1, 2, 10.0, '2024-03-01', None),
+        ('online', 1, 1, 2, 10.0, '2024-03-02', None),
+        ('in_store', 1, 1, 2, 10.0, '2024-03-01', None),
+        ('in_store', None, 1, 2, 10.0, '2024-03-01', None),
+        ('in_store', None, 1, 2, 10.0, '2024-03-01', None),
+    ))
+    assert rejects.empty
+
+def test_signed_change_rows_skip_the_duplicate_check(dq_config):
+    # The old and new side of an update carry the same sale_id
+    valid, rejects, _ = validate_sales_data(sales(
+        ('online', 1, 1, 2, 10.0, '2024-03-01', -1),
+        ('online', 1, 1, 3, 15.0, '2024-03-01', 1),
+    ))
+    assert rejects.empty
+    assert list(valid['quantity']) == [-2, 3]
+    assert list(valid['sale_amount']) == [-10.0, 15.0]
+
+def test_quarantine_keeps_the_rejected_rows_and_reasons(dq_config):
+    _, rejects, _ = validate_sales_data(sales(
+        ('online', 1, 1, 2, 10.0, '2024-03-01', None),
+        ('in_store', 2, 1, -2, 10.0, '2024-03-01', None),
+    ))
+    path = write_quarantine(rejects)
+    assert path.startswith(dq_config.quarantine_dir) and path.endswith('.csv.gz')
+    written = pd.read_csv(path)
+    assert written[['source', 'sale_id', 'sale_date', 'reason']].values.tolist() == [
+        ['in_store', 2, '2024-03-01', 'negative_quantity'],
+    ]